@@ -0,0 +1,10 @@
+"""`python -m src`: the headless batch scheduler (see cli.py)."""
+import time
+started = time.perf_counter()
+
+import os, sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from cli import main
+
+if __name__ == "__main__":
+    sys.exit(main(started=started))
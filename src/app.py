@@ -1,17 +1,313 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, g, request, jsonify, render_template, stream_with_context
+import io
 import uuid
-from scheduler import Scheduler
+import time
+from scheduler import DEFAULT_TIME_BUDGET, SolveStats
+from recurrence import Recurrence
+from sessions import SessionCache, diff_schedules
+from storage import open_store
+from prompt_context import TaskContext, prompt_window
+import transfer
+import metrics
 #For AI route
 import os
 import json
-from openai import OpenAI
+import llm
 from datetime import datetime, timedelta, date
 
 
 
 app = Flask(__name__, static_folder="static", template_folder="templates")
 
-tasks = []
+# CALENDAR_DB is a SQLite path, or "memory" for a throwaway in-process store
+DB_LOCATION = os.getenv(
+    "CALENDAR_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "calendar.db")
+)
+
+# Warm per-calendar Schedulers; idle calendars fall out and are rebuilt on
+# demand. Unless SCHEDULE_PRECOMPUTE=0, edits re-solve the schedule in the
+# background so the next read doesn't have to.
+sessions = SessionCache(lambda calendar_id: open_store(DB_LOCATION, calendar_id),
+                        max_sessions=int(os.getenv("SESSION_CACHE_SIZE", "128")),
+                        precompute=os.getenv("SCHEDULE_PRECOMPUTE", "1") == "1")
+
+
+@metrics.registry.collector
+def _session_gauges():
+    stats = sessions.stats()
+    return [(f"calendar_sessions_{k}", {}, v) for k, v in stats.items()]
+
+
+def _session():
+    """Session for the calendar named by X-Calendar-Id or ?calendar=."""
+    calendar_id = request.headers.get("X-Calendar-Id") or request.args.get("calendar") or "default"
+    return sessions.get(calendar_id)
+
+
+# SCHEDULER_METRICS=1 instruments every solve; otherwise only requests
+# that ask for it with ?profile=1 or an "X-Profile: 1" header
+PROFILE_ALL = os.getenv("SCHEDULER_METRICS") == "1"
+
+# cap on ?budget_ms= for engine=optimal, so one request can't hog a worker
+MAX_TIME_BUDGET_MS = float(os.getenv("OPTIMAL_MAX_BUDGET_MS", "2000"))
+
+# /import stores and schedules tasks this many at a time, and reports at
+# most IMPORT_MAX_ERRORS of the records it had to skip
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_ERRORS = 100
+
+
+@app.before_request
+def _start_timer():
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def _record_timing(response):
+    if "started" in g:
+        metrics.registry.observe(
+            "http_request_duration_seconds", time.perf_counter() - g.started,
+            route  = request.url_rule.rule if request.url_rule else "unmatched",
+            method = request.method,
+            status = response.status_code,
+        )
+    return response
+
+
+@app.errorhandler(500)
+def _server_error(e):
+    # JSON like every other error here, rather than Flask's HTML page
+    return jsonify({"error": "Internal server error"}), 500
+
+
+def _profile_requested():
+    return request.args.get("profile") == "1" or request.headers.get("X-Profile") == "1"
+
+
+def _spillover_requested():
+    return request.args.get("spillover") == "1"
+
+
+def _parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date() if value else None
+
+
+def _request_window(payload, actions=()):
+    """
+    Date window a request needs loaded: the optional start_date/end_date
+    in the payload, widened to cover any goals it schedules. (None, None)
+    means the whole calendar.
+    """
+    window = _parse_date(payload.get("start_date")), _parse_date(payload.get("end_date"))
+    return _widen(window, actions)
+
+
+def _widen(window, actions):
+    """Stretch a (start, end) window over the days the actions' goals touch."""
+    start, end = window
+    if start is None and end is None:
+        return None, None
+    for a in actions:
+        typ = a.get("type") if isinstance(a, dict) else None
+        if typ == "add_goal_hybrid":
+            days = [date.today()]
+        elif typ == "add_goal_periodic":
+            days = [_parse_date(a["start_date"]), _parse_date(a["end_date"])]
+        else:
+            continue
+        start = min([d for d in [start, *days] if d])
+        end   = max([d for d in [end, *days] if d])
+    return start, end
+
+
+def _working_copy(session, actions=()):
+    """
+    Scheduler a request should work on: a fork of the session's warm one
+    when the request adds goals (which are never stored), is being
+    profiled or asks for another engine or spillover, otherwise None,
+    meaning "use the session directly".
+    """
+    profiling = PROFILE_ALL or _profile_requested()
+    if (not profiling and request.args.get("engine", "greedy") == "greedy"
+            and not _spillover_requested()
+            and not any(isinstance(a, dict) and a.get("type") in GOAL_ACTIONS for a in actions)):
+        return None
+    scheduler = session.fork()
+    if profiling:
+        scheduler.profile = SolveStats()
+    return scheduler
+
+
+def _in_window(items, window):
+    start, end = window
+    if start is None and end is None:
+        return items
+    lo, hi = (start or date.min).isoformat(), (end or date.max).isoformat()
+    return [i for i in items if lo <= str(i.get("date")) <= hi]
+
+
+def _engine_options():
+    """Solver engine, time budget and spillover from ?engine=, ?budget_ms= and ?spillover=1."""
+    budget_ms = float(request.args.get("budget_ms", DEFAULT_TIME_BUDGET * 1000))
+    return {"engine":      request.args.get("engine", "greedy"),
+            "time_budget": max(0.0, min(budget_ms, MAX_TIME_BUDGET_MS)) / 1000,
+            "spillover":   _spillover_requested()}
+
+
+def _schedule_response(session, scheduler, window=(None, None), since=None):
+    """
+    Build the JSON reply the schedule routes share. Every reply carries a
+    "version"; a client that sends back the version it holds as `since`
+    gets only the blocks added, removed and moved since then.
+    """
+    body = {}
+    try:
+        bounds = window if window != (None, None) else None
+        if scheduler is None:
+            scheduled, unscheduled = session.schedule(bounds)
+        else:
+            scheduled = scheduler.schedule(window=bounds, **_engine_options())
+            unscheduled = scheduler.unscheduled
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if scheduler is not None and scheduler.optimizer_report is not None:
+        body["optimizer"] = scheduler.optimizer_report
+    if scheduler is not None and scheduler.profile is not None:
+        metrics.record_solve(scheduler.profile)
+        if _profile_requested():
+            body["profile"] = scheduler.profile.as_dict(scheduler.solved_days)
+    body["version"] = session.snapshot(scheduled)
+    previous = session.since(since) if since else None
+    if previous is not None:
+        body["since"] = since
+        body["delta"] = diff_schedules(_in_window(previous, window), _in_window(scheduled, window))
+    else:
+        body["scheduled"] = _in_window(scheduled, window)
+    body["unscheduled"] = _in_window(unscheduled, window)
+    return jsonify(body), 200
+
+
+def _since(payload):
+    """Schedule version the client already holds, from the body or ?since=."""
+    return payload.get("since") or request.args.get("since")
+
+
+def _stamp_date(task):
+    """
+    Pin undated tasks to the day they were created. Sessions outlive the
+    day, so leaving them undated would put them wherever the session's
+    scheduler happened to be anchored, not on "today".
+    """
+    if not task.get("date"):
+        task["date"] = date.today().isoformat()
+    return task
+
+
+GOAL_ACTIONS = ("add_goal_hybrid", "add_goal_periodic")
+
+
+def _apply_action(session, scheduler, a):
+    """
+    Apply one AI action. Task edits are persisted to the session (store
+    and warm Scheduler) and mirrored into `scheduler` if that is a
+    working copy; goals only ever go to the working copy. Returns an
+    error message for unknown or malformed actions.
+    """
+    if not isinstance(a, dict):
+        return f"Malformed action: {a!r}"
+    try:
+        # store write and session edit together (see CalendarSession.writing)
+        with session.writing():
+            return _apply(session, scheduler, a)
+    except (KeyError, TypeError, ValueError) as e:
+        # missing or mistyped fields, e.g. a move_task without task_id
+        return f"Malformed {a.get('type')} action: {type(e).__name__}: {e}"
+
+
+class _Rejected(Exception):
+    """Raised inside a write batch to roll it back; the message is the 400's."""
+
+
+def _apply_all(session, scheduler, actions):
+    """
+    Apply actions as one batch: all of them, or none if one is bad (the
+    batch rolls back). Returns the first error message, or None.
+    """
+    try:
+        with session.writing():
+            for a in actions:
+                error = _apply_action(session, scheduler, a)
+                if error:
+                    raise _Rejected(error)
+    except _Rejected as e:
+        return str(e)
+    return None
+
+
+def _apply(session, scheduler, a):
+    typ = a.get("type")
+    if typ in GOAL_ACTIONS and scheduler is None:
+        raise ValueError("goal actions need a working copy of the scheduler")
+
+    def edit(fn):
+        session.edit(fn)
+        if scheduler is not None:
+            fn(scheduler)
+
+    if typ == "add_task":
+        # nested { "task": {…} } or flattened fields
+        task = _stamp_date(dict(a.get("task") or {k: v for k, v in a.items() if k != "type"}))
+        error = transfer.task_error(task)
+        if error:
+            return f"Bad task: {error}"
+        stored = session.store.add(task)
+        edit(lambda s: s.add_task(stored))
+
+    elif typ == "add_goal_hybrid":
+        scheduler.add_goal_hybrid(
+            title          = a["title"],
+            total_minutes  = a["total_minutes"],
+            max_block_size = a["max_block_size"],
+            priority       = a.get("priority", "medium")
+        )
+
+    elif typ == "add_goal_periodic":
+        # parse dates and call the periodic helper
+        scheduler.add_goal_periodic(
+            title          = a["title"],
+            total_minutes  = a["total_minutes"],
+            max_block_size = a["max_block_size"],
+            start_date     = _parse_date(a["start_date"]),
+            end_date       = _parse_date(a["end_date"]),
+            rest_between   = a.get("rest_between", 0),
+            priority       = a.get("priority", "medium")
+        )
+
+    elif typ == "add_rest":
+        rest_task = {
+            "title":    a.get("title", "Rest"),
+            "duration": a["duration"],
+            "fixed":    False
+        }
+        error = transfer.task_error(_stamp_date(rest_task))
+        if error:
+            return f"Bad rest: {error}"
+        stored = session.store.add(rest_task)
+        edit(lambda s: s.add_task(stored))
+
+    elif typ == "move_task":
+        edit(lambda s: s.move_task(a["task_id"], a.get("earliest_time"), a.get("latest_time")))
+        window = {k: a[k] for k in ("earliest_time", "latest_time") if a.get(k)}
+        if window:
+            session.store.update(a["task_id"], **window)
+
+    elif typ == "remove_task":
+        edit(lambda s: s.remove_task(a["task_id"]))
+        session.store.remove(a["task_id"])
+
+    else:
+        return f"Unknown action type: {typ}"
+    return None
 
 @app.route('/')
 def home():
@@ -32,146 +328,115 @@ def add_task():
 
     if "start_time" in data:
         task["start_time"] = data["start_time"]
-
-    tasks.append(task)
+    if data.get("recurrence"):
+        task["recurrence"] = data["recurrence"]
+    # validate before storing: a task the scheduler can't compile would
+    # break every later load of this calendar
+    error = transfer.task_error(_stamp_date(task))
+    if error:
+        return jsonify({"error": error}), 400
+
+    session = _session()
+    with session.writing():
+        task = session.store.add(task)
+        session.edit(lambda s: s.add_task(task))
     print(f"Added task:{task}")
     return jsonify({"status": "success","task": task}), 201
 
 @app.route('/get-tasks', methods=["GET"])
 def get_tasks():
-    return jsonify({"tasks": tasks}), 200
+    """
+    Stored tasks, optionally limited to ?start=&end= (ISO dates) and paged
+    with ?offset=&limit=. Answers 304 when If-None-Match still matches.
+    """
+    session = _session()
+    # tag before loading, so a racing edit can only make the tag older
+    # than the body, never newer
+    etag = session.etag(request.query_string.decode())
+    if request.if_none_match.contains(etag):
+        return "", 304, {"ETag": f'"{etag}"'}
+
+    try:
+        start  = _parse_date(request.args.get("start"))
+        end    = _parse_date(request.args.get("end"))
+        offset = max(0, int(request.args.get("offset", 0)))
+        limit  = int(request.args["limit"]) if request.args.get("limit") else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # one extra row tells us whether there is another page
+    tasks = session.store.load(start, end, offset, None if limit is None else limit + 1)
+    body  = {"tasks": tasks}
+    if limit is not None:
+        body["tasks"]       = tasks[:limit]
+        body["next_offset"] = offset + limit if len(tasks) > limit else None
+    resp = jsonify(body)
+    resp.set_etag(etag)
+    return resp, 200
 
 from datetime import datetime, timedelta
 
 @app.route("/schedule", methods=["POST"])
 def schedule_tasks():
-    payload   = request.get_json() or {}
-    scheduler = Scheduler()
+    payload = request.get_json() or {}
 
-    # 1) Re-add all stored tasks
-    for t in tasks:
-        scheduler.add_task(t)
+    # 1) Goals ride on the stored tasks but are not persisted
+    goals = []
+    if payload.get("goal"):
+        goals.append({**payload["goal"], "type": "add_goal_hybrid"})
+    if payload.get("periodic_goal"):
+        goals.append({**payload["periodic_goal"], "type": "add_goal_periodic"})
 
-    # 2) Hybrid goal (single-day) if provided
-    goal = payload.get("goal")
-    if goal:
-        scheduler.add_goal_hybrid(
-            title          = goal["title"],
-            total_minutes  = goal["total_minutes"],
-            max_block_size = goal["max_block_size"],
-            priority       = goal.get("priority", "medium")
-        )
+    # 2) This calendar's warm scheduler, or a copy of it to add goals to
+    session   = _session()
+    scheduler = _working_copy(session, goals)
 
-    # 3) Periodic goal (multi-day) if provided
-    periodic = payload.get("periodic_goal")
-    if periodic:
-        sd = datetime.strptime(periodic["start_date"], "%Y-%m-%d").date()
-        ed = datetime.strptime(periodic["end_date"],   "%Y-%m-%d").date()
-        scheduler.add_goal_periodic(
-            title          = periodic["title"],
-            total_minutes  = periodic["total_minutes"],
-            max_block_size = periodic["max_block_size"],
-            start_date     = sd,
-            end_date       = ed,
-            rest_between   = periodic.get("rest_between", 0),
-            priority       = periodic.get("priority", "medium")
-        )
+    # 3) Hybrid goal (single-day) and/or periodic goal (multi-day)
+    for goal in goals:
+        error = _apply_action(session, scheduler, goal)
+        if error:
+            return jsonify({"error": error}), 400
 
     # 4) Run the scheduler and return the result
-    try:
-        result = scheduler.schedule()
-        return jsonify({"scheduled": result}), 200
-    except ValueError as e:
-        return jsonify({"error": str(e)}), 400
+    return _schedule_response(session, scheduler, _request_window(payload, goals), _since(payload))
 
 
 @app.route("/ai-schedule", methods=["POST"])
 def ai_schedule():
     payload   = request.get_json() or {}
-    scheduler = Scheduler()
+    actions   = payload.get("actions", [])
 
-    #Re-add all stored tasks so we keep pre-existing items
-    for t in tasks:
-        scheduler.add_task(t)
+    #Work on this calendar's stored tasks so we keep pre-existing items
+    session   = _session()
+    scheduler = _working_copy(session, actions)
 
-    # Apply any “actions” the client sent
+    # Apply any “actions” the client sent, all or none
     #    Each action is a dict with a "type" and its parameters.
-    for action in payload.get("actions", []):
-        typ = action.get("type")
-        if typ == "add_task":
-            # expects: { "type":"add_task", "task": { … } }
-            scheduler.add_task(action["task"])
-            tasks.append(action["task"])
-        elif typ == "add_goal_hybrid":
-            # expects keys: title, total_minutes, max_block_size, [priority]
-            scheduler.add_goal_hybrid(
-                title          = action["title"],
-                total_minutes  = action["total_minutes"],
-                max_block_size = action["max_block_size"],
-                priority       = action.get("priority", "medium")
-            )
-        elif typ == "add_goal_periodic":
-            sd = datetime.strptime(action["start_date"], "%Y-%m-%d").date()
-            ed = datetime.strptime(action["end_date"],   "%Y-%m-%d").date()
-            scheduler.add_goal_periodic(
-                title          = action["title"],
-                total_minutes  = action["total_minutes"],
-                max_block_size = action["max_block_size"],
-                start_date     = sd,
-                end_date       = ed,
-                rest_between   = action.get("rest_between", 0),
-                priority       = action.get("priority", "medium")
-            )
-        elif typ == "move_task":
-            scheduler.move_task(action["task_id"],
-                                action.get("earliest_time"),
-                                action.get("latest_time"))
-            for t in tasks:
-                if t.get("id") == action["task_id"]:
-                    if action.get("earliest_time"):
-                        t["earliest_time"] = action["earliest_time"]
-                    if action.get("latest_time"):
-                        t["latest_time"] = action["latest_time"]
-                    break
-        elif typ == "remove_task":
-            scheduler.remove_task(action["task_id"])
-            tasks[:] = [t for t in tasks if t.get("id") != action["task_id"]]
-        else:
-            return jsonify({
-              "error": f"Unknown action type: {typ}"
-            }), 400
+    error = _apply_all(session, scheduler, actions)
+    if error:
+        return jsonify({"error": error}), 400
 
     # 3 Run the scheduler and return the result
-    try:
-        result = scheduler.schedule()
-        return jsonify({"scheduled": result}), 200
-    except ValueError as e:
-        return jsonify({"error": str(e)}), 400
+    return _schedule_response(session, scheduler, _request_window(payload, actions), _since(payload))
     
 
 
 
-@app.route("/natural-schedule", methods=["POST"])
-def natural_schedule():
-    data = request.get_json() or {}
-    prompt = data.get("prompt", "").strip()
-    if not prompt:
-        return jsonify({"error": "Missing 'prompt' in request body."}), 400
-
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        return jsonify({"error": "OpenAI API key not configured."}), 500
+# Instructions for the LLM (now including add_goal_periodic)
+SYSTEM_PROMPT = """
+You are an AI calendar assistant. You receive existing tasks and a user instruction,
+and must output ONLY a JSON object with an \"actions\" array.
 
-    openai_client = OpenAI(api_key=api_key)
+Existing tasks arrive as a table, one row per task: id|title|date|time|min|pri|repeat
+(time is the start for fixed tasks, or an earliest-latest window). Use the row's id
+(t1, t2, …) as task_id. Lines starting with # only count tasks that aren't listed.
 
-    # 1️⃣ Build the messages for the LLM (now including add_goal_periodic)
-    system_msg = """
-You are an AI calendar assistant. You receive existing tasks and a user instruction,
-and must output ONLY a JSON object with an \"actions\" array. Valid actions:
+Valid actions:
 
   • add_task
     – Nested: { \"type\":\"add_task\", \"task\":{…} }
     – or flattened: { \"type\":\"add_task\", \"title\":…, \"duration\":…, \"fixed\":…, [\"start_time\"] }
+    – repeating tasks add [\"recurrence\": { \"freq\":\"daily\"|\"weekly\"|\"weekdays\", [\"byweekday\":[\"mon\",…]], [\"until\":\"YYYY-MM-DD\"], [\"exceptions\":[\"YYYY-MM-DD\",…]] }]
 
   • add_goal_hybrid
     – { \"type\":\"add_goal_hybrid\", \"title\":…, \"total_minutes\":…, \"max_block_size\":…, [\"priority\"] }
@@ -218,102 +483,246 @@ Should output:
   ]
 }
 """
-    existing = json.dumps(tasks)
-    messages = [
-        {"role": "system",    "content": system_msg},
-        {"role": "assistant", "content": f"Existing tasks: {existing}"},
-        {"role": "user",      "content": prompt},
-    ]
-
-    resp = openai_client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
-        temperature=0
-    )
-    content = resp.choices[0].message.content
-
-    # 2️⃣ Parse the LLM’s JSON
-    try:
-        payload = json.loads(content)
-        actions = payload.get("actions", [])
-    except json.JSONDecodeError:
-        return jsonify({
-            "error": "Could not parse LLM response as JSON",
-            "raw_response": content
-        }), 500
 
-    # 3️⃣ Replay actions through your Scheduler
-    scheduler = Scheduler()
-    for t in tasks:
-        scheduler.add_task(t)
 
-    for a in actions:
-        typ = a.get("type")
-        if typ == "add_task":
-            task = a.get("task") or {k: v for k, v in a.items() if k != "type"}
-            scheduler.add_task(task)
-            tasks.append(task)
-
-        elif typ == "add_goal_hybrid":
-            scheduler.add_goal_hybrid(
-                title          = a["title"],
-                total_minutes  = a["total_minutes"],
-                max_block_size = a["max_block_size"],
-                priority       = a.get("priority", "medium")
-            )
+def _task_context(session, data, prompt):
+    """
+    The calendar's tasks as the model sees them: a budgeted table of the
+    ones near the instruction's dates (see prompt_context.TaskContext).
+    """
+    scheduler = session.scheduler
+    tasks = scheduler.tasks + [rec.task for _, rec in scheduler.series]
+    context = TaskContext(tasks, prompt_window(prompt, _request_window(data)))
+    metrics.registry.observe("llm_context_tokens", context.tokens)
+    metrics.registry.observe("llm_context_tokens_saved", context.full_tokens - context.tokens)
+    return context
+
+
+def _natural_prepare():
+    """
+    First half of /natural-schedule, everything before the model call.
+    Returns ((data, session, task_context, prompt), None), or (None, error).
+    """
+    data = request.get_json() or {}
+    prompt = data.get("prompt", "").strip()
+    if not prompt:
+        return None, (jsonify({"error": "Missing 'prompt' in request body."}), 400)
 
-        elif typ == "add_goal_periodic":
-            # parse dates and call the periodic helper
-            sd = datetime.strptime(a["start_date"], "%Y-%m-%d").date()
-            ed = datetime.strptime(a["end_date"],   "%Y-%m-%d").date()
-            scheduler.add_goal_periodic(
-                title          = a["title"],
-                total_minutes  = a["total_minutes"],
-                max_block_size = a["max_block_size"],
-                start_date     = sd,
-                end_date       = ed,
-                rest_between   = a.get("rest_between", 0),
-                priority       = a.get("priority", "medium")
-            )
-
-        elif typ == "add_rest":
-            rest_task = {
-                "title":    a.get("title", "Rest"),
-                "duration": a["duration"],
-                "fixed":    False
-            }
-            scheduler.add_task(rest_task)
-            tasks.append(rest_task)
-
-        elif typ == "move_task":
-            scheduler.move_task(a["task_id"], a.get("earliest_time"), a.get("latest_time"))
-            for t in tasks:
-                if t.get("id") == a["task_id"]:
-                    if a.get("earliest_time"):
-                        t["earliest_time"] = a["earliest_time"]
-                    if a.get("latest_time"):
-                        t["latest_time"] = a["latest_time"]
-                    break
-
-        elif typ == "remove_task":
-            scheduler.remove_task(a["task_id"])
-            tasks[:] = [t for t in tasks if t.get("id") != a["task_id"]]
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return None, (jsonify({"error": "OpenAI API key not configured."}), 500)
+
+    # 1️⃣ Existing tasks for the LLM's context
+    session = _session()
+    return (data, session, _task_context(session, data, prompt), prompt), None
+
+
+def _llm_error(e):
+    return jsonify({
+        "error": str(e),
+        "raw_response": e.raw_response
+    }), 500
 
-        else:
-            return jsonify({"error": f"Unknown action type '{typ}'"}), 400
+
+def _natural_finish(data, session, task_context, actions):
+    """Second half of /natural-schedule: replay the model's actions."""
+    # 3️⃣ Replay actions through your Scheduler
+    actions   = [task_context.resolve(a) for a in actions]
+    scheduler = _working_copy(session, actions)
+    error = _apply_all(session, scheduler, actions)
+    if error:
+        return jsonify({"error": error}), 400
 
     # 4️⃣ Generate and return the final schedule
+    return _schedule_response(session, scheduler, _request_window(data, actions), _since(data))
+
+
+@app.route("/natural-schedule", methods=["POST"])
+def natural_schedule():
+    context, error = _natural_prepare()
+    if error:
+        return error
+    data, session, task_context, prompt = context
+
+    # 2️⃣ Ask the LLM (or the cache) and parse its JSON
     try:
+        actions = llm.request_actions(SYSTEM_PROMPT, task_context.text, prompt)
+    except llm.LLMResponseError as e:
+        return _llm_error(e)
+
+    return _natural_finish(data, session, task_context, actions)
+
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+
+@app.route("/natural-schedule/stream", methods=["POST"])
+def natural_schedule_stream():
+    """
+    Like /natural-schedule, but streams the completion and applies each
+    action as soon as its JSON object is complete. Emits Server-Sent
+    Events: one "action" event (with the updated schedule) per action,
+    then "done", or "error" if the reply is unusable.
+    """
+    data = request.get_json() or {}
+    prompt = data.get("prompt", "").strip()
+    if not prompt:
+        return jsonify({"error": "Missing 'prompt' in request body."}), 400
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return jsonify({"error": "OpenAI API key not configured."}), 500
+
+    session  = _session()
+    window   = _request_window(data)
+    context  = _task_context(session, data, prompt)
+    # actions aren't known up front, so always work on a copy
+    scheduler = session.fork()
+
+    def snapshot():
         scheduled = scheduler.schedule()
-        return jsonify({"scheduled": scheduled}), 200
+        return {"scheduled":   _in_window(scheduled, window),
+                "unscheduled": _in_window(scheduler.unscheduled, window)}
+
+    def events():
+        nonlocal window
+        try:
+            for a in llm.stream_actions(SYSTEM_PROMPT, context.text, prompt):
+                a = context.resolve(a)
+                error = _apply_action(session, scheduler, a)
+                if error:
+                    yield _sse("error", {"error": error})
+                    return
+                window = _widen(window, [a])
+                yield _sse("action", {"action": a, **snapshot()})
+            yield _sse("done", snapshot())
+        except llm.LLMResponseError as e:
+            yield _sse("error", {"error": str(e), "raw_response": e.raw_response})
+        except ValueError as e:
+            yield _sse("error", {"error": str(e)})
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/llm-stats", methods=["GET"])
+def llm_stats():
+    return jsonify(llm.cache.stats()), 200
+
+
+def _upload():
+    """
+    (format, lines) of an /import upload: a multipart file or the raw
+    body, iterated line by line rather than read whole. The format comes
+    from ?format=, else the content type, else the file name.
+    """
+    if request.files:
+        upload = next(iter(request.files.values()))
+        stream, mimetype, name = upload.stream, upload.mimetype, upload.filename or ""
+    else:
+        # the raw body stream is unbuffered; its readline() goes byte by byte
+        stream, mimetype, name = io.BufferedReader(request.stream, 1 << 16), request.mimetype, ""
+    fmt = request.args.get("format")
+    if not fmt:
+        if mimetype == "text/calendar" or name.lower().endswith(".ics"):
+            fmt = "ics"
+        else:
+            fmt = "ndjson"
+    return fmt, stream
+
+
+@app.route("/import", methods=["POST"])
+def import_tasks():
+    """
+    Bulk-add tasks from NDJSON (one task object per line) or an .ics
+    file. Records are parsed as the upload streams in, validated and
+    stored IMPORT_BATCH_SIZE at a time; bad ones and ids already on this
+    calendar are skipped and reported by line (ids are per calendar, so
+    the same .ics can go into several). The whole import becomes
+    one new version of the calendar.
+    """
+    fmt, lines = _upload()
+    parsers = {"ndjson": transfer.parse_ndjson, "ics": transfer.parse_ics}
+    if fmt not in parsers:
+        return jsonify({"error": f"Unknown format {fmt!r}; use ndjson or ics."}), 400
+
+    session = _session()
+    current = session.scheduler
+    known   = {t.get("id") for t in current.tasks} | {rec.task.get("id") for _, rec in current.series}
+    imported, errors, skipped = 0, [], 0
+    with session.writing():
+        for batch in transfer.batches(parsers[fmt](lines), IMPORT_BATCH_SIZE):
+            good = []
+            # the store too, in one query: it may hold rows the session skipped
+            stored = session.store.existing({t["id"] for _, t, _ in batch if t and t.get("id")})
+            for line, task, error in batch:
+                error = error or transfer.task_error(task)
+                if not error and task.get("id") and (task["id"] in known or task["id"] in stored):
+                    error = f"duplicate id {task['id']!r}"
+                if error:
+                    skipped += 1
+                    if len(errors) < IMPORT_MAX_ERRORS:
+                        errors.append({"line": line, "error": error})
+                    continue
+                if task.get("id"):
+                    known.add(task["id"])
+                good.append(_stamp_date(task))
+            if good:
+                stored = session.store.add_many(good)
+                session.edit(lambda s: [s.add_task(t) for t in stored])
+                imported += len(stored)
+    return jsonify({"imported": imported, "skipped": skipped, "errors": errors}), 200
+
+
+@app.route("/export", methods=["GET"])
+def export_tasks():
+    """
+    Stream the schedule (or, with ?what=tasks, the stored tasks) as
+    NDJSON or, with ?format=ics, iCalendar; ?start=&end= limit the dates.
+    Tasks come from one published version of the calendar, so a
+    concurrent edit can't tear the export.
+    """
+    fmt  = request.args.get("format", "ndjson")
+    what = request.args.get("what", "schedule")
+    if fmt not in ("ndjson", "ics") or what not in ("schedule", "tasks"):
+        return jsonify({"error": "format must be ndjson or ics, what schedule or tasks"}), 400
+    try:
+        window = _parse_date(request.args.get("start")), _parse_date(request.args.get("end"))
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
 
+    session = _session()
+    if what == "tasks":
+        scheduler = session.scheduler
+        items = (_in_window(scheduler.tasks, window) +
+                 [rec.task for _, rec in scheduler.series])
+    else:
+        try:
+            scheduled, _ = session.schedule(window if window != (None, None) else None)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        items = _in_window(scheduled, window)
+
+    if fmt == "ics":
+        body, mimetype = transfer.to_ics(items, tasks=(what == "tasks")), "text/calendar"
+    else:
+        body, mimetype = transfer.to_ndjson(items), "application/x-ndjson"
+    return Response(transfer.chunked(body), mimetype=mimetype, headers={
+        "Content-Disposition": f'attachment; filename="{what}.{fmt}"'})
 
 
 @app.route("/reset-tasks", methods=["POST"])
 def reset_tasks():
-    tasks.clear()
+    session = _session()
+    with session.writing():
+        session.store.clear()
+        session.reset()
     return jsonify({"status": "cleared"}), 200
 
 if __name__ == '__main__':
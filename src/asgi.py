@@ -0,0 +1,172 @@
+"""
+ASGI entry point, for serving from an event loop:
+
+    uvicorn asgi:app --app-dir src
+
+POST /natural-schedule awaits the model on the async OpenAI client, so a
+request waiting on the model holds no worker thread. At most
+LLM_MAX_CONCURRENCY upstream calls are in flight and each gets
+LLM_TIMEOUT seconds, queueing included (504 when it runs out). The work
+around the call, and every other route, runs the Flask app on the
+event loop's thread pool.
+"""
+import asyncio
+import contextvars
+import io
+import sys
+import time
+
+from flask import g
+
+import llm
+from app import app as flask_app, SYSTEM_PROMPT, _llm_error, _natural_finish, _natural_prepare
+
+ASYNC_ROUTES = {("POST", "/natural-schedule")}
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    body = await _read_body(receive)
+    environ = _environ(scope, body)
+    if (scope["method"], scope["path"]) in ASYNC_ROUTES:
+        await _natural_schedule(environ, body, send)
+    else:
+        await _wsgi(environ, send)
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+def _environ(scope, body):
+    """WSGI environ for an ASGI http scope."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD":    scope["method"],
+        "SCRIPT_NAME":       scope.get("root_path", ""),
+        "PATH_INFO":         scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING":      scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME":       server[0],
+        "SERVER_PORT":       str(server[1]),
+        "SERVER_PROTOCOL":   f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR":       client[0],
+        "CONTENT_LENGTH":    str(len(body)),
+        "wsgi.version":      (1, 0),
+        "wsgi.url_scheme":   scope.get("scheme", "http"),
+        "wsgi.input":        io.BytesIO(body),
+        "wsgi.errors":       sys.stderr,
+        "wsgi.multithread":  True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once":     False,
+    }
+    for name, value in scope.get("headers", ()):
+        key, value = name.decode("latin-1").upper().replace("-", "_"), value.decode("latin-1")
+        if key == "CONTENT_TYPE":
+            environ[key] = value
+        elif key != "CONTENT_LENGTH":
+            key = "HTTP_" + key
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def _start(send, status, headers):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]})
+
+
+async def _wsgi(environ, send):
+    """Run the Flask app on a worker thread, streaming its body back chunk by chunk."""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"], started["headers"] = int(status.split()[0]), headers
+
+    # every step runs in one context, so a streamed body still sees the
+    # request context it pushed on its first step
+    context  = contextvars.copy_context()
+    result   = await asyncio.to_thread(context.run, flask_app, environ, start_response)
+    iterator = iter(result)
+    try:
+        await _start(send, started["status"], started["headers"])
+        while True:
+            chunk = await asyncio.to_thread(context.run, next, iterator, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(result, "close"):
+            await asyncio.to_thread(context.run, result.close)
+
+
+def _in_request(environ, body, started, fn, *args):
+    """
+    Call fn inside a Flask request context, handled the way wsgi_app and
+    full_dispatch_request would: before_request hooks, then error
+    handlers and after_request hooks (the /metrics timing among them) on
+    what it returns. `started` carries the request's start time across
+    its steps. fn returns None to go on to another step, with no response.
+    """
+    with flask_app.request_context({**environ, "wsgi.input": io.BytesIO(body)}):
+        try:
+            try:
+                rv = flask_app.preprocess_request()
+                g.started = started
+                if rv is None:
+                    rv = fn(*args)
+                    if rv is None:
+                        return None
+            except Exception as e:
+                rv = flask_app.handle_user_exception(e)
+            return flask_app.finalize_request(rv)
+        except Exception as e:
+            # the JSON 500 any other route gets (re-raised when testing)
+            return flask_app.handle_exception(e)
+
+
+async def _natural_schedule(environ, body, send):
+    started = time.perf_counter()
+    prepared = {}
+
+    def prepare():
+        context, error = _natural_prepare()
+        prepared["context"] = context
+        return error
+
+    response = await asyncio.to_thread(_in_request, environ, body, started, prepare)
+    if response is None:
+        data, session, task_context, prompt = prepared["context"]
+        try:
+            actions = await llm.request_actions_async(SYSTEM_PROMPT, task_context.text, prompt)
+        except llm.LLMResponseError as e:
+            response = await asyncio.to_thread(_in_request, environ, body, started, _llm_error, e)
+        except llm.LLMTimeoutError as e:
+            response = await asyncio.to_thread(
+                _in_request, environ, body, started, lambda: ({"error": str(e)}, 504))
+        else:
+            response = await asyncio.to_thread(
+                _in_request, environ, body, started,
+                _natural_finish, data, session, task_context, actions)
+
+    await _start(send, response.status_code, response.headers.to_wsgi_list())
+    await send({"type": "http.response.body", "body": response.get_data()})
@@ -0,0 +1,203 @@
+"""
+Scheduler benchmarks.
+
+    python src/bench_scheduler.py                    # run, compare to baseline
+    python src/bench_scheduler.py --full             # include the 100k scenarios
+    python src/bench_scheduler.py --update-baseline  # record new baseline
+
+Each scenario is timed (best of --repeat runs) and run once more under
+tracemalloc for peak memory. Times are compared as multiples of a fixed
+pure-Python reference workload timed alongside each scenario, so a
+slower or busier machine moves both alike. The run fails if any scenario's
+multiple is above its stored baseline's by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+sys.path.append(os.path.dirname(__file__))
+from scheduler import Scheduler
+
+BASELINE = os.path.join(os.path.dirname(__file__), "bench_baseline.json")
+START    = date(2025, 1, 6)
+
+
+def generate_workload(seed, n_tasks, days, fixed_ratio=0.25,
+                      tightness=0.5, overload=1.0):
+    """
+    Seeded list of task dicts spread over `days` days from START.
+
+    fixed_ratio   share of tasks pinned to a start_time
+    tightness     0..1, how narrow flexible tasks' earliest/latest windows are
+    overload      ~ demanded minutes / available minutes per day; above 1
+                  the day solver spends its time on tasks that don't fit
+    """
+    rng = random.Random(seed)
+    per_day   = max(1, n_tasks // days)
+    # average duration that makes a day's demand ~ overload x 9:00-23:59
+    mean_dur  = max(5, int(overload * 899 / per_day))
+    tasks = []
+    for i in range(n_tasks):
+        day = START + timedelta(days=i % days)
+        dur = max(5, int(rng.expovariate(1 / mean_dur)) // 5 * 5)
+        task = {
+            "id":       f"t{i}",
+            "title":    f"Task {i}",
+            "duration": dur,
+            "priority": rng.choice(("high", "medium", "low")),
+            "date":     day,
+        }
+        if rng.random() < fixed_ratio:
+            task["fixed"] = True
+            task["start_time"] = f"{rng.randrange(7, 22):02d}:{rng.choice((0, 15, 30, 45)):02d}"
+        elif rng.random() < tightness:
+            lo = rng.randrange(9 * 60, 20 * 60)
+            hi = min(23 * 60 + 59, lo + 2 * dur + int((1 - tightness) * 600))
+            task["earliest_time"] = f"{lo // 60:02d}:{lo % 60:02d}"
+            task["latest_time"]   = f"{hi // 60:02d}:{hi % 60:02d}"
+        tasks.append(task)
+    return tasks
+
+
+def _scheduler(tasks):
+    sched = Scheduler(base_time=datetime.combine(START, datetime.min.time()).replace(hour=9))
+    for t in tasks:
+        sched.add_task(dict(t))
+    return sched
+
+
+def _schedule(tasks, **kwargs):
+    def run():
+        _scheduler(tasks).schedule(**kwargs)
+    return run
+
+
+def _incremental(tasks):
+    sched = _scheduler(tasks)
+    sched.schedule()
+    flip = ["09:00", "13:00"]
+
+    def run():
+        flip.reverse()
+        sched.move_task("t1", earliest_time=flip[0])
+        sched.schedule()
+    return run
+
+
+def _periodic(fixed, days):
+    def run():
+        sched = _scheduler(fixed)
+        sched.add_goal_periodic("Goal", total_minutes=days * 90, max_block_size=45,
+                                start_date=START, end_date=START + timedelta(days=days - 1),
+                                rest_between=10)
+        sched.schedule()
+    return run
+
+
+def reference():
+    """Fixed workload, independent of the scheduler, that times are relative to."""
+    rng   = random.Random(0)
+    items = [(rng.randrange(1440), f"k{i}") for i in range(30_000)]
+    index = {}
+    for start, key in sorted(items):
+        index.setdefault(start // 60, []).append(key)
+    return sum(len(v) for v in index.values())
+
+
+def scenarios(full=False):
+    """name -> zero-argument callable, setup already done."""
+    s = {
+        "day_10":             _schedule(generate_workload(1, 10, 1)),
+        "horizon_1k_30d":     _schedule(generate_workload(2, 1_000, 30)),
+        "horizon_10k_365d":   _schedule(generate_workload(3, 10_000, 365)),
+        "fixed_heavy_10k":    _schedule(generate_workload(4, 10_000, 365, fixed_ratio=0.8)),
+        "tight_windows_10k":  _schedule(generate_workload(5, 10_000, 365, tightness=0.95)),
+        "overloaded_5k_20d":  _schedule(generate_workload(6, 5_000, 20, overload=3.0)),
+        "spillover_5k_20d":   _schedule(generate_workload(6, 5_000, 20, overload=3.0), spillover=True),
+        "incremental_10k":    _incremental(generate_workload(7, 10_000, 365)),
+        "periodic_goal_365d": _periodic(generate_workload(8, 2_000, 365, fixed_ratio=1.0), 365),
+    }
+    if full:
+        s["horizon_100k_3650d"]  = _schedule(generate_workload(9, 100_000, 3650))
+        s["overloaded_100k_200d"] = _schedule(generate_workload(10, 100_000, 200, overload=3.0))
+    return s
+
+
+def measure(run, repeat):
+    best = min(_timed(run) for _ in range(repeat))
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(best, 6), "peak_kb": peak // 1024}
+
+
+def relative(result, reference_seconds):
+    return round(result["seconds"] / reference_seconds, 6)
+
+
+def _timed(run):
+    started = time.perf_counter()
+    run()
+    return time.perf_counter() - started
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    p.add_argument("--full", action="store_true", help="include 100k-task scenarios")
+    p.add_argument("--repeat", type=int, default=3)
+    # reruns on a shared machine still spread ~1.5x even as multiples of the
+    # reference; a real algorithmic regression shows up well past 2x
+    p.add_argument("--tolerance", type=float, default=1.0,
+                   help="allowed slowdown vs baseline, 1.0 = twice as slow")
+    p.add_argument("--only", help="run scenarios whose name contains this")
+    p.add_argument("--update-baseline", action="store_true")
+    args = p.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+
+    results, regressions = {}, []
+    for name, run in scenarios(args.full).items():
+        if args.only and args.only not in name:
+            continue
+        results[name] = r = measure(run, args.repeat)
+        # right next to the scenario, so both see the same machine state
+        ref = min(_timed(reference) for _ in range(max(args.repeat, 5)))
+        r["relative"] = relative(r, ref)
+        base = baseline.get(name)
+        note = ""
+        if base and "relative" in base:
+            ratio = r["relative"] / base["relative"]
+            note = f"{ratio:6.2f}x baseline"
+            # tiny scenarios are all noise; also require 2 ms of real slowdown
+            # (baseline time rescaled to this machine)
+            if ratio > 1 + args.tolerance and r["seconds"] - base["relative"] * ref > 0.002:
+                regressions.append(name)
+                note += "  REGRESSION"
+        print(f"{name:24} {r['seconds'] * 1000:10.1f} ms {r['relative']:8.3f}x ref "
+              f"{r['peak_kb']:10d} KiB  {note}")
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(BASELINE, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline written to {BASELINE}")
+        return 0
+
+    if regressions:
+        print(f"{len(regressions)} scenario(s) slower than baseline: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Headless batch scheduling, without the web app.
+
+    python -m src calendars/                    # every .ndjson/.ics file in there
+    python -m src alice.ndjson team.ics --engine optimal
+    export-job | python -m src - > plans.ndjson
+
+A file is one calendar, named after the file: NDJSON tasks (one task
+object per line) or iCalendar (.ics). "-", the default, reads calendars
+from stdin instead, one {"calendar": id, "tasks": [...]} object per line.
+
+Calendars are parsed and scheduled on a pool of --workers processes and
+written to stdout as they finish, in input order, one NDJSON line each:
+{"calendar", "scheduled", "unscheduled", "tasks", "skipped", "ms"}. A
+timing report (startup, throughput, per-calendar latency) goes to stderr.
+A calendar that can't be read (missing file, bad stdin line) gets a
+{"calendar", "error", "ms"} line instead and the rest carry on; the exit
+status is 1 if any calendar failed.
+
+Only the standard library and the scheduler load at startup; Flask and
+the OpenAI SDK never do, and the process pool and the optimizer load
+only when asked for.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, datetime
+
+from scheduler import DEFAULT_TIME_BUDGET, Scheduler
+import transfer
+
+CALENDAR_EXTENSIONS = (".ndjson", ".jsonl", ".json", ".ics")
+
+_worker_options = None   # schedule_calendar options, in pool workers
+
+
+def read_calendars(sources):
+    """
+    Yield (calendar id, source) jobs: a file path for the workers to
+    parse, a list of task dicts read from stdin, or the ValueError for a
+    stdin line that isn't a calendar. Nothing is read ahead of what the
+    pool asks for.
+    """
+    for source in sources or ["-"]:
+        if source == "-":
+            for n, line in enumerate(sys.stdin, 1):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except ValueError as e:
+                    yield f"stdin-{n}", ValueError(f"stdin line {n}: {e}")
+                    continue
+                if not isinstance(item, dict):
+                    yield f"stdin-{n}", ValueError(f"stdin line {n}: not an object")
+                    continue
+                yield str(item.get("calendar") or f"stdin-{n}"), item.get("tasks", [])
+        elif os.path.isdir(source):
+            for name in sorted(os.listdir(source)):
+                if name.endswith(CALENDAR_EXTENSIONS):
+                    yield os.path.splitext(name)[0], os.path.join(source, name)
+        else:
+            yield os.path.splitext(os.path.basename(source))[0], source
+
+
+def _records(source):
+    """(line, task, error) for a job's source, as transfer's parsers give them."""
+    if isinstance(source, Exception):
+        raise source
+    if not isinstance(source, str):
+        return ((n, t if isinstance(t, dict) else None, None if isinstance(t, dict) else "not an object")
+                for n, t in enumerate(source, 1))
+    with open(source, "rb") as f:
+        parse = transfer.parse_ics if source.endswith(".ics") else transfer.parse_ndjson
+        return list(parse(f))
+
+
+def schedule_calendar(job, options):
+    """
+    Parse, validate and schedule one calendar; returns its output record,
+    or an {"calendar", "error", "ms"} record if it failed.
+    """
+    name, source = job
+    started = time.perf_counter()
+    try:
+        scheduler = Scheduler(base_time=options["base_time"])
+        tasks = skipped = 0
+        for _, task, error in _records(source):
+            if error or transfer.task_error(task):
+                skipped += 1
+                continue
+            scheduler.add_task(task)
+            tasks += 1
+        scheduled = scheduler.schedule(window=options["window"], engine=options["engine"],
+                                       time_budget=options["time_budget"],
+                                       spillover=options["spillover"])
+    except Exception as e:
+        # one bad calendar shouldn't take the rest of the batch down with it
+        return {"calendar": name,
+                "error":    str(e) or type(e).__name__,
+                "ms":       round((time.perf_counter() - started) * 1000, 3)}
+    return {"calendar":    name,
+            "scheduled":   scheduled,
+            "unscheduled": scheduler.unscheduled,
+            "tasks":       tasks,
+            "skipped":     skipped,
+            "ms":          round((time.perf_counter() - started) * 1000, 3)}
+
+
+def _run(job):
+    # pool workers get the options once, through the initializer
+    return schedule_calendar(job, _worker_options)
+
+
+def _init_worker(options):
+    global _worker_options
+    _worker_options = options
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def main(argv=None, started=None):
+    started = started if started is not None else time.perf_counter()
+    p = argparse.ArgumentParser(prog="python -m src", description=__doc__.split("\n\n")[0].strip())
+    p.add_argument("sources", nargs="*", help='calendar files or directories, or "-" for stdin')
+    p.add_argument("--date", type=date.fromisoformat, help="day to anchor at 9:00 (default today)")
+    p.add_argument("--start", type=date.fromisoformat, help="first date to schedule")
+    p.add_argument("--end", type=date.fromisoformat, help="last date to schedule")
+    p.add_argument("--engine", choices=("greedy", "optimal"), default="greedy")
+    p.add_argument("--budget-ms", type=float, default=DEFAULT_TIME_BUDGET * 1000,
+                   help="engine=optimal search time per calendar")
+    p.add_argument("--spillover", action="store_true")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                   help="worker processes; 1 schedules in this process")
+    p.add_argument("--chunksize", type=int, default=4, help="calendars handed to a worker at a time")
+    p.add_argument("-o", "--output", help="write results here instead of stdout")
+    p.add_argument("-q", "--quiet", action="store_true", help="no timing report")
+    args = p.parse_args(argv)
+
+    options = {
+        "base_time":   datetime.combine(args.date or date.today(), datetime.min.time()).replace(hour=9),
+        "window":      (args.start, args.end) if args.start or args.end else None,
+        "engine":      args.engine,
+        "time_budget": args.budget_ms / 1000,
+        "spillover":   args.spillover,
+    }
+    jobs = read_calendars(args.sources)
+    pool = None
+    if args.workers > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(args.workers, initializer=_init_worker, initargs=(options,))
+        results = pool.imap(_run, jobs, chunksize=args.chunksize)
+    else:
+        results = (schedule_calendar(job, options) for job in jobs)
+    ready = time.perf_counter()
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    latencies, tasks, failed = [], 0, 0
+    first = None
+    try:
+        for result in results:
+            out.write(json.dumps(result, default=str) + "\n")
+            first = first or time.perf_counter()
+            latencies.append(result["ms"])
+            if "error" in result:
+                failed += 1
+                continue
+            tasks += result["tasks"]
+        out.flush()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - ready
+    if not args.quiet:
+        report = (f"startup {(ready - started) * 1000:.0f} ms, "
+                  f"{len(latencies)} calendars ({tasks} tasks) in {elapsed:.2f} s "
+                  f"on {args.workers} worker{'s' if args.workers != 1 else ''}")
+        if failed:
+            report = f"{failed} of {len(latencies)} calendars failed; " + report
+        if latencies:
+            latencies.sort()
+            report += (f": {len(latencies) / elapsed:.0f} calendars/s, first after "
+                       f"{(first - started) * 1000:.0f} ms, per calendar p50 "
+                       f"{_percentile(latencies, 0.5):.1f} ms, p95 {_percentile(latencies, 0.95):.1f} ms, "
+                       f"max {latencies[-1]:.1f} ms")
+        print(report, file=sys.stderr)
+    return 1 if failed else 0
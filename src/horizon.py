@@ -0,0 +1,100 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+from intervals import IntervalIndex, MaxTree
+
+MINUTES_PER_DAY = 1440
+
+# how many days past its own a task without a "deadline" may move
+SPILLOVER_DAYS = 14
+
+
+def _deadline(task):
+    value = task.get("deadline")
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(value)
+
+
+def spill(by_date, results, anchor, end=None):
+    """
+    Carry flexible tasks their own day couldn't fit forward to the
+    earliest later gap, keeping their earliest/latest times of day.
+
+    by_date maps each date to its TaskRecords and results to the solved
+    (placed, unscheduled) for that date, as Scheduler.schedule() holds
+    them; anchor is the minute tasks without an earliest_time start from.
+    A task may move up to its "deadline" date, or SPILLOVER_DAYS past its
+    own day, and never past `end`. Recurring tasks stay put; their next
+    occurrence is already coming.
+
+    Every day from the first to the last reachable one gets a slot in a
+    max segment tree holding its longest free stretch within the hours
+    any candidate could use (all of them for dates without tasks), so
+    each task jumps straight to days with room for it instead of trying
+    them one by one.
+
+    Returns (moved, left): date -> [(start, record, origin date)] for the
+    tasks that moved, and date -> indices still unplaced on that date.
+    """
+    days = sorted(by_date)
+    candidates = []   # (origin, priority, earliest, index, limit)
+    for day in days:
+        records = by_date[day]
+        for i in results[day][1]:
+            r = records[i]
+            if r.fixed or r.task.get("recurrence"):
+                continue
+            limit = _deadline(r.task) or day + timedelta(days=SPILLOVER_DAYS)
+            if end is not None:
+                limit = min(limit, end)
+            if limit > day:
+                candidates.append((day, r.priority, r.earliest or 0, i, limit))
+    left = {day: list(results[day][1]) for day in days}
+    if not candidates:
+        return {}, left
+
+    # only the part of each day some candidate could use counts as room
+    lo = min(anchor if by_date[c[0]][c[3]].earliest is None else c[2] for c in candidates)
+    hi = min(MINUTES_PER_DAY, max(by_date[c[0]][c[3]].latest for c in candidates))
+    lo = min(lo, hi)
+
+    first = days[0]
+    span  = (max(c[4] for c in candidates) - first).days + 1
+    indexes, gaps = {}, [hi - lo] * span
+    for day in days:
+        offset = (day - first).days
+        if offset >= span:
+            break
+        index = indexes[offset] = IntervalIndex()
+        records = by_date[day]
+        for st, i in results[day][0]:
+            index.add(st, st + records[i].duration, i)
+        gaps[offset] = index.max_gap(lo, hi)
+    tree = MaxTree(gaps)
+
+    moved = defaultdict(list)
+    candidates.sort(key=lambda c: c[:3])
+    for origin, _, _, i, limit in candidates:
+        r = by_date[origin][i]
+        earliest = anchor if r.earliest is None else r.earliest
+        latest   = r.latest   # find_gap keeps start + duration <= latest
+        offset   = (origin - first).days + 1
+        stop     = (limit - first).days + 1
+        while True:
+            offset = tree.first_at_least(offset, r.duration, stop)
+            if offset is None:
+                break
+            index = indexes.get(offset)
+            if index is None:
+                index = indexes[offset] = IntervalIndex()
+            start = index.find_gap(r.duration, earliest, latest)
+            if start is not None:
+                index.add(start, start + r.duration, i)
+                tree.update(offset, index.max_gap(lo, hi))
+                moved[first + timedelta(days=offset)].append((start, r, origin))
+                left[origin].remove(i)
+                break
+            # room that day, just not inside this task's window
+            offset += 1
+    return moved, left
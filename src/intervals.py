@@ -0,0 +1,151 @@
+from bisect import bisect_left, bisect_right, insort
+
+
+class IntervalIndex:
+    """
+    Sorted index of busy intervals for one day.
+
+    Keeps the raw blocks (so they can be evicted again) alongside the
+    merged busy intervals they cover. Gap lookups bisect straight to the
+    first merged interval that can affect `earliest` and only walk the
+    gaps inside the requested window.
+    """
+
+    def __init__(self):
+        self._blocks = []   # (start, seq, end, record), sorted by start
+        self._starts = []   # merged busy intervals, disjoint and sorted
+        self._ends   = []
+        self._seq    = 0
+
+    def copy(self):
+        other = IntervalIndex()
+        other._blocks = list(self._blocks)
+        other._starts = list(self._starts)
+        other._ends   = list(self._ends)
+        other._seq    = self._seq
+        return other
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def __iter__(self):
+        """Yield (start, end, record) in insertion order."""
+        for st, _, en, rec in sorted(self._blocks, key=lambda b: b[1]):
+            yield st, en, rec
+
+    def add(self, start, end, record):
+        """Insert a busy block and fold it into the merged intervals."""
+        self._seq += 1
+        insort(self._blocks, (start, self._seq, end, record),
+               key=lambda b: (b[0], b[1]))
+
+        # merged intervals touching [start, end] collapse into one
+        i = bisect_left(self._ends, start)
+        j = bisect_right(self._starts, end)
+        if i < j:
+            start = min(start, self._starts[i])
+            end   = max(end, self._ends[j - 1])
+        self._starts[i:j] = [start]
+        self._ends[i:j]   = [end]
+
+    def remove(self, start, end, record):
+        """Drop a previously added block; raises ValueError if missing."""
+        lo = bisect_left(self._blocks, start, key=lambda b: b[0])
+        hi = bisect_right(self._blocks, start, key=lambda b: b[0])
+        for k in range(lo, hi):
+            if self._blocks[k][3] == record and self._blocks[k][2] == end:
+                del self._blocks[k]
+                break
+        else:
+            raise ValueError("block not in index")
+
+        # rebuild just the merged interval that contained the block
+        m = bisect_right(self._starts, start) - 1
+        m_st, m_en = self._starts[m], self._ends[m]
+        lo = bisect_left(self._blocks, m_st, key=lambda b: b[0])
+        hi = bisect_right(self._blocks, m_en, key=lambda b: b[0])
+        starts, ends = [], []
+        for st, _, en, _ in self._blocks[lo:hi]:
+            if ends and st <= ends[-1]:
+                ends[-1] = max(ends[-1], en)
+            else:
+                starts.append(st)
+                ends.append(en)
+        self._starts[m:m + 1] = starts
+        self._ends[m:m + 1]   = ends
+
+    def max_gap(self, lo=0, hi=1440):
+        """Longest free stretch inside [lo, hi)."""
+        best, cursor = 0, lo
+        for st, en in zip(self._starts, self._ends):
+            if en <= cursor:
+                continue
+            if st >= hi:
+                break
+            best   = max(best, st - cursor)
+            cursor = max(cursor, en)
+        return max(best, hi - cursor)
+
+    def find_gap(self, dur, earliest, latest):
+        """
+        Earliest start >= earliest where `dur` fits before the next busy
+        interval and start + dur <= latest. Returns None if nothing fits.
+        """
+        candidate = earliest
+        i = bisect_right(self._ends, earliest)
+        n = len(self._starts)
+        while i < n:
+            if candidate + dur <= self._starts[i]:
+                break
+            candidate = max(candidate, self._ends[i])
+            if candidate > latest:
+                return None
+            i += 1
+        if candidate + dur <= latest:
+            return candidate
+        return None
+
+
+class MaxTree:
+    """
+    Max segment tree over a fixed run of slots (days, here), answering
+    "first slot at or after i whose value is at least x" in O(log n).
+    """
+
+    def __init__(self, values):
+        self.n = n = len(values)
+        size = 1
+        while size < n:
+            size *= 2
+        self.size = size
+        self.tree = [-1] * (2 * size)
+        self.tree[size:size + n] = values
+        for k in range(size - 1, 0, -1):
+            self.tree[k] = max(self.tree[2 * k], self.tree[2 * k + 1])
+
+    def update(self, i, value):
+        k = self.size + i
+        self.tree[k] = value
+        k //= 2
+        while k:
+            self.tree[k] = max(self.tree[2 * k], self.tree[2 * k + 1])
+            k //= 2
+
+    def first_at_least(self, i, x, stop=None):
+        """Smallest slot j with i <= j < stop and value >= x, or None."""
+        stop = self.n if stop is None else min(stop, self.n)
+        if i >= stop:
+            return None
+        k = self.size + i
+        if self.tree[k] >= x:
+            return i
+        # climb until the right sibling's subtree holds a big enough value
+        while k > 1 and (k % 2 == 1 or self.tree[k + 1] < x):
+            k //= 2
+        if k == 1:
+            return None
+        k += 1
+        while k < self.size:
+            k = 2 * k if self.tree[2 * k] >= x else 2 * k + 1
+        j = k - self.size
+        return j if j < stop else None
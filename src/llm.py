@@ -0,0 +1,321 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from metrics import registry
+
+MODEL = "gpt-4o-mini"
+
+# seconds an upstream completion may take; the async path also counts
+# time spent queueing for one of LLM_MAX_CONCURRENCY slots
+TIMEOUT         = float(os.getenv("LLM_TIMEOUT", "30"))
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "256"))
+
+_client = None
+_client_lock = threading.Lock()
+_async_client = None
+_async_slots  = weakref.WeakKeyDictionary()   # event loop -> Semaphore
+_inflight     = 0
+
+
+@registry.collector
+def _cache_gauges():
+    stats = cache.stats()
+    return ([(f"llm_cache_{k}", {}, stats[k]) for k in ("size", "hits", "misses", "llm_calls")] +
+            [("llm_async_inflight", {}, _inflight)])
+
+
+def get_client():
+    """Process-wide OpenAI client, so connections are pooled across requests."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=TIMEOUT)
+    return _client
+
+
+def get_async_client():
+    """Process-wide AsyncOpenAI client for the ASGI path (see asgi.py)."""
+    global _async_client
+    if _async_client is None:
+        from openai import AsyncOpenAI
+        _async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=TIMEOUT)
+    return _async_client
+
+
+def _slots():
+    """This event loop's semaphore capping concurrent upstream calls."""
+    loop = asyncio.get_running_loop()
+    slots = _async_slots.get(loop)
+    if slots is None:
+        slots = _async_slots[loop] = asyncio.Semaphore(MAX_CONCURRENCY)
+    return slots
+
+
+class LLMResponseError(ValueError):
+    """The model answered with something that isn't an actions object."""
+
+    def __init__(self, raw_response):
+        super().__init__("Could not parse LLM response as JSON")
+        self.raw_response = raw_response
+
+
+class LLMTimeoutError(TimeoutError):
+    """The model didn't answer within TIMEOUT seconds."""
+
+
+class ActionStreamParser:
+    """
+    Incremental parser for a streamed `{"actions": [ {...}, ... ]}` reply.
+
+    feed() takes raw text chunks as they arrive and returns the action
+    objects completed by that chunk, so each can be applied before the
+    rest of the completion has been generated.
+    """
+
+    def __init__(self):
+        self.text     = ""      # everything received, for error reporting
+        self.actions  = []      # every action parsed so far
+        self.done     = False   # saw the closing ] of the actions array
+        self._state   = "key"   # key -> array -> objects
+        self._buf     = []      # characters of the object being read
+        self._depth   = 0
+        self._in_str  = False
+        self._escaped = False
+
+    def feed(self, chunk):
+        start = len(self.text)
+        self.text += chunk
+        completed = []
+        i = start
+        while i < len(self.text) and not self.done:
+            if self._state == "key":
+                # wait until the "actions" key has fully arrived
+                k = self.text.find('"actions"', max(0, i - len('"actions"')))
+                if k < 0:
+                    return completed
+                self._state, i = "array", k + len('"actions"')
+                continue
+            c = self.text[i]
+            i += 1
+            if self._state == "array":
+                if c == "[":
+                    self._state = "objects"
+                continue
+            if self._depth == 0:
+                if c == "{":
+                    self._depth, self._buf = 1, [c]
+                elif c == "]":
+                    self.done = True
+                continue
+            self._buf.append(c)
+            if self._in_str:
+                if self._escaped:
+                    self._escaped = False
+                elif c == "\\":
+                    self._escaped = True
+                elif c == '"':
+                    self._in_str = False
+            elif c == '"':
+                self._in_str = True
+            elif c == "{":
+                self._depth += 1
+            elif c == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    action = json.loads("".join(self._buf))
+                    self.actions.append(action)
+                    completed.append(action)
+        return completed
+
+
+class ActionCache:
+    """
+    LRU cache of parsed action lists with a per-entry TTL, plus the
+    hit/miss/latency counters reported on /llm-stats.
+    """
+
+    def __init__(self, max_size=256, ttl=300.0):
+        self.max_size = max_size
+        self.ttl      = ttl
+        self._entries = OrderedDict()   # key -> (expires_at, actions JSON)
+        self._lock    = threading.Lock()
+        self.hits = self.misses = self.calls = 0
+        self.latency_total = 0.0        # seconds spent waiting on the model
+
+    @staticmethod
+    def key(system_msg, existing, prompt):
+        h = hashlib.sha256()
+        for part in (system_msg, existing, prompt):
+            h.update(part.encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(entry[1])
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, actions):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, json.dumps(actions))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def record_call(self, seconds):
+        with self._lock:
+            self.calls += 1
+            self.latency_total += seconds
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size":           len(self._entries),
+                "hits":           self.hits,
+                "misses":         self.misses,
+                "hit_rate":       self.hits / lookups if lookups else 0.0,
+                "llm_calls":      self.calls,
+                "avg_latency_ms": 1000 * self.latency_total / self.calls if self.calls else 0.0,
+            }
+
+
+cache = ActionCache(
+    max_size = int(os.getenv("LLM_CACHE_SIZE", "256")),
+    ttl      = float(os.getenv("LLM_CACHE_TTL", "300")),
+)
+
+
+def _messages(system_msg, existing, prompt):
+    return [
+        {"role": "system",    "content": system_msg},
+        {"role": "assistant", "content": f"Existing tasks: {existing}"},
+        {"role": "user",      "content": prompt},
+    ]
+
+
+def request_actions(system_msg, existing, prompt):
+    """
+    Ask the model for an actions list, served from the cache when the
+    same prompt was already answered against the same task state.
+    Raises LLMResponseError if the reply isn't valid JSON.
+    """
+    key = cache.key(system_msg, existing, prompt)
+    actions = cache.get(key)
+    if actions is not None:
+        return actions
+
+    messages = _messages(system_msg, existing, prompt)
+    started = time.perf_counter()
+    resp = get_client().chat.completions.create(
+        model=MODEL,
+        messages=messages,
+        temperature=0
+    )
+    elapsed = time.perf_counter() - started
+    cache.record_call(elapsed)
+    registry.observe("llm_request_duration_seconds", elapsed, mode="complete")
+    actions = _parse_actions(resp.choices[0].message.content)
+    cache.put(key, actions)
+    return actions
+
+
+async def request_actions_async(system_msg, existing, prompt):
+    """
+    request_actions on the async client. Waits for one of MAX_CONCURRENCY
+    upstream slots, and raises LLMTimeoutError if queueing plus the call
+    take longer than TIMEOUT.
+    """
+    key = cache.key(system_msg, existing, prompt)
+    actions = cache.get(key)
+    if actions is not None:
+        return actions
+
+    async def call():
+        global _inflight
+        async with _slots():
+            _inflight += 1
+            try:
+                started = time.perf_counter()
+                resp = await get_async_client().chat.completions.create(
+                    model=MODEL,
+                    messages=_messages(system_msg, existing, prompt),
+                    temperature=0
+                )
+            finally:
+                _inflight -= 1
+            return resp, time.perf_counter() - started
+
+    try:
+        resp, elapsed = await asyncio.wait_for(call(), TIMEOUT)
+    except asyncio.TimeoutError:
+        raise LLMTimeoutError(f"No answer from the model within {TIMEOUT:g}s")
+    cache.record_call(elapsed)
+    registry.observe("llm_request_duration_seconds", elapsed, mode="async")
+    actions = _parse_actions(resp.choices[0].message.content)
+    cache.put(key, actions)
+    return actions
+
+
+def _parse_actions(content):
+    try:
+        return json.loads(content).get("actions", [])
+    except (json.JSONDecodeError, AttributeError, TypeError):
+        raise LLMResponseError(content)
+
+
+def stream_actions(system_msg, existing, prompt):
+    """
+    Streaming variant of request_actions: yields each action as soon as
+    its JSON object is complete in the model's token stream. Cache hits
+    replay the cached list. Raises LLMResponseError if the stream ends
+    without a complete actions array.
+    """
+    key = cache.key(system_msg, existing, prompt)
+    actions = cache.get(key)
+    if actions is not None:
+        yield from actions
+        return
+
+    messages = _messages(system_msg, existing, prompt)
+    started = time.perf_counter()
+    stream = get_client().chat.completions.create(
+        model=MODEL,
+        messages=messages,
+        temperature=0,
+        stream=True
+    )
+    parser = ActionStreamParser()
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if text:
+                yield from parser.feed(text)
+    except json.JSONDecodeError:
+        raise LLMResponseError(parser.text)
+    finally:
+        elapsed = time.perf_counter() - started
+        cache.record_call(elapsed)
+        registry.observe("llm_request_duration_seconds", elapsed, mode="stream")
+
+    if not parser.done:
+        raise LLMResponseError(parser.text)
+    cache.put(key, parser.actions)
@@ -0,0 +1,112 @@
+"""
+Load test for the async /natural-schedule path.
+
+    python src/load_test.py                       # 500 requests, 0.5 s model latency
+    python src/load_test.py --requests 2000 --latency 1.0 --limit 64
+
+Runs asgi.app in-process over httpx's ASGI transport, with the OpenAI
+client pointed at a local stub of the chat completions API that answers
+after --latency seconds. Every request uses a distinct prompt, so the
+action cache never answers for the model.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(__file__))
+
+
+def completions_stub(latency, stats):
+    """ASGI app imitating POST /v1/chat/completions, slowly."""
+    async def stub(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        prompt = json.loads(body)["messages"][-1]["content"]
+
+        stats["inflight"] += 1
+        stats["peak"] = max(stats["peak"], stats["inflight"])
+        try:
+            await asyncio.sleep(latency)
+        finally:
+            stats["inflight"] -= 1
+
+        content = json.dumps({"actions": [{"type": "add_task", "title": prompt, "duration": 30}]})
+        reply = json.dumps({
+            "id": "stub", "object": "chat.completion", "created": 0, "model": "stub",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+        }).encode()
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": reply})
+    return stub
+
+
+async def run(n_requests, latency, calendars):
+    import httpx
+    from openai import AsyncOpenAI
+    import asgi
+    import llm
+
+    stats = {"inflight": 0, "peak": 0}
+    llm._async_client = AsyncOpenAI(
+        api_key="stub", base_url="http://stub/v1", max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=completions_stub(latency, stats))))
+
+    async def one(client, i):
+        t = time.perf_counter()
+        resp = await client.post("/natural-schedule", json={"prompt": f"load test task {i}"},
+                                 headers={"X-Calendar-Id": f"load-{i % calendars}"})
+        return resp.status_code, time.perf_counter() - t
+
+    transport = httpx.ASGITransport(app=asgi.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=None) as client:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one(client, i) for i in range(n_requests)))
+        elapsed = time.perf_counter() - started
+    return results, elapsed, stats["peak"]
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    p.add_argument("--requests", type=int, default=500)
+    p.add_argument("--latency", type=float, default=0.5, help="stub model latency, seconds")
+    p.add_argument("--calendars", type=int, default=50, help="spread requests over this many calendars")
+    p.add_argument("--limit", type=int, help="LLM_MAX_CONCURRENCY for the run")
+    p.add_argument("--timeout", type=float, help="LLM_TIMEOUT for the run")
+    args = p.parse_args(argv)
+
+    os.environ.setdefault("CALENDAR_DB", "memory")
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    import llm
+    if args.limit:
+        llm.MAX_CONCURRENCY = args.limit
+    if args.timeout:
+        llm.TIMEOUT = args.timeout
+
+    results, elapsed, peak = asyncio.run(run(args.requests, args.latency, args.calendars))
+    latencies = sorted(t for _, t in results)
+    codes = {}
+    for status, _ in results:
+        codes[status] = codes.get(status, 0) + 1
+    print(f"{args.requests} requests in {elapsed:.2f} s ({args.requests / elapsed:.0f} req/s), "
+          f"stub latency {args.latency:g} s")
+    print(f"latency p50 {statistics.median(latencies) * 1000:.0f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f} ms, "
+          f"max {latencies[-1] * 1000:.0f} ms")
+    print(f"peak concurrent upstream calls {peak}, status codes {codes}")
+    return 0 if set(codes) == {200} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import threading
+from collections import defaultdict
+
+
+class Registry:
+    """
+    Minimal Prometheus-style metrics: counters and summaries (count + sum)
+    keyed by name and labels, plus collector callbacks for gauges that
+    live elsewhere. render() produces the text exposition format.
+    """
+
+    def __init__(self):
+        self._lock       = threading.Lock()
+        self._help       = {}
+        self._counters   = defaultdict(float)               # (name, labels) -> value
+        self._summaries  = defaultdict(lambda: [0, 0.0])    # (name, labels) -> [count, sum]
+        self._collectors = []
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            entry = self._summaries[key]
+            entry[0] += 1
+            entry[1] += value
+
+    def collector(self, fn):
+        """Register fn() -> iterable of (name, labels dict, value) gauges."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        with self._lock:
+            counters  = sorted(self._counters.items())
+            summaries = sorted((k, tuple(v)) for k, v in self._summaries.items())
+        gauges = sorted((name, tuple(sorted(labels.items())), value)
+                        for fn in self._collectors for name, labels, value in fn())
+
+        lines, typed = [], set()
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {_num(value)}")
+        for (name, labels), (count, total) in summaries:
+            header(name, "summary")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {_num(total)}")
+        for name, labels, value in gauges:
+            header(name, "gauge")
+            lines.append(f"{name}{_labels(labels)} {_num(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                    for k, v in labels)
+    return "{" + body + "}"
+
+
+def _num(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+registry.describe("http_request_duration_seconds", "Flask request latency by route.")
+registry.describe("scheduler_phase_seconds", "Time spent per scheduler phase.")
+registry.describe("scheduler_gap_probes_per_day", "Gap lookups per solved day.")
+registry.describe("scheduler_evictions_per_day", "Preemption evictions per solved day.")
+registry.describe("llm_request_duration_seconds", "OpenAI round-trip latency.")
+registry.describe("llm_context_tokens", "Estimated prompt tokens of the task context sent.")
+registry.describe("llm_context_tokens_saved", "Estimated prompt tokens saved per request vs the full JSON dump.")
+
+
+def record_solve(stats):
+    """Fold a scheduler SolveStats into the registry."""
+    for phase, seconds in stats.phases.items():
+        registry.observe("scheduler_phase_seconds", seconds, phase=phase)
+    for probes, evictions in stats.per_day:
+        registry.observe("scheduler_gap_probes_per_day", probes)
+        registry.observe("scheduler_evictions_per_day", evictions)
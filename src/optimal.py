@@ -0,0 +1,144 @@
+import random
+from time import perf_counter
+
+from intervals import IntervalIndex
+from scheduler import solve_day
+
+# objective weight per priority code (high, medium, low), per minute placed
+PRIORITY_WEIGHTS = (4, 2, 1)
+
+
+def objective(keys, placed):
+    """Priority-weighted minutes of flexible work in a (start, index) placement."""
+    return sum(PRIORITY_WEIGHTS[keys[i][5]] * keys[i][2] for _, i in placed if not keys[i][0])
+
+
+def improve_day(keys, anchor, greedy, deadline, seed=0):
+    """
+    Anytime local search over one day, starting from the greedy result.
+
+    A candidate is an order of the flexible tasks; it is decoded by
+    placing each task at its earliest gap in turn, which can reach any
+    feasible placement (take the tasks in the order they start in it).
+    Moves pull a task that did not fit towards the front, or swap two
+    tasks; equal-scoring moves are taken so the search can drift across
+    plateaus. The best placement seen is kept, so stopping at any point
+    returns something no worse than greedy.
+
+    The search stops when every task that could fit alone has been
+    placed (provably optimal) or before the decode that would overrun
+    `deadline` (a perf_counter() value), judged by the slowest decode so
+    far. Returns (placed, unscheduled, proven, decodes).
+    """
+    placed, unscheduled = greedy
+    if perf_counter() >= deadline:
+        return placed, unscheduled, False, 0
+    base = IntervalIndex()
+    for i, (fixed, start, dur, *_) in enumerate(keys):
+        if fixed:
+            base.add(start, start + dur, i)
+
+    windows = {}
+    for i, (fixed, _, dur, earliest, latest, _) in enumerate(keys):
+        # same window solve_day uses
+        if not fixed:
+            windows[i] = (dur, anchor if earliest is None else earliest, latest)
+    weight = {i: PRIORITY_WEIGHTS[keys[i][5]] * keys[i][2] for i in windows}
+    # tasks that can't fit even into the bare day never will
+    hopeless = {i for i, w in windows.items() if base.find_gap(*w) is None}
+    upper    = sum(w for i, w in weight.items() if i not in hopeless)
+
+    best_score = objective(keys, placed)
+    if best_score >= upper:
+        return placed, unscheduled, True, 0
+
+    def decode(order):
+        index = base.copy()
+        starts, score = {}, 0
+        for i in order:
+            dur, earliest, latest = windows[i]
+            start = index.find_gap(dur, earliest, latest)
+            if start is not None:
+                index.add(start, start + dur, i)
+                starts[i] = start
+                score += weight[i]
+        return score, starts
+
+    if perf_counter() >= deadline:
+        return placed, unscheduled, False, 0
+    rng   = random.Random(seed)
+    order = ([i for _, i in placed if i in windows] +
+             [i for i in unscheduled if i in windows and i not in hopeless])
+    best  = None
+    score, starts = decode(order)
+    slowest = decodes = 0
+    proven  = False
+    while not proven:
+        if perf_counter() + slowest >= deadline:
+            break
+        cand = list(order)
+        missing = [k for k, i in enumerate(cand) if i not in starts]
+        if missing and rng.random() < 0.7:
+            k = rng.choice(missing)
+            cand.insert(rng.randrange(k + 1), cand.pop(k))
+        elif len(cand) > 1:
+            a, b = rng.sample(range(len(cand)), 2)
+            cand[a], cand[b] = cand[b], cand[a]
+
+        t = perf_counter()
+        cand_score, cand_starts = decode(cand)
+        slowest = max(slowest, perf_counter() - t)
+        decodes += 1
+        if cand_score >= score:
+            order, score, starts = cand, cand_score, cand_starts
+            if score > best_score:
+                best_score, best = score, dict(starts)
+                proven = best_score >= upper
+
+    if best is None:
+        return placed, unscheduled, proven, decodes
+    scheduled = {i: keys[i][1] for i, k in enumerate(keys) if k[0]}
+    scheduled.update(best)
+    placed = sorted(((st, i) for i, st in scheduled.items()), key=lambda x: x[0])
+    return placed, [i for i in range(len(keys)) if i not in scheduled], proven, decodes
+
+
+def solve_days(day_keys, time_budget, stats=None):
+    """
+    Optimizing counterpart of solving Scheduler.schedule()'s day keys.
+
+    Every day is solved greedily first; then `time_budget` seconds of
+    search are shared out among the days greedy could not fully place,
+    each getting an equal slice of what remains when its turn comes.
+    The greedy pass is not part of the budget. Returns (results, seconds
+    spent searching); each result is (placed, unscheduled, summary)
+    where summary compares the day against its greedy solution.
+    """
+    greedy = [solve_day(keys, hour * 60 + minute, stats=stats)
+              for (hour, minute), keys in day_keys]
+    searching = perf_counter()
+    deadline  = searching + time_budget
+    todo = {d for d, (_, unscheduled) in enumerate(greedy)
+            if any(not day_keys[d][1][i][0] for i in unscheduled)}
+    left = len(todo)
+
+    results = []
+    for d, ((hour, minute), keys) in enumerate(day_keys):
+        placed, unscheduled = greedy[d]
+        summary = {"greedy_objective": objective(keys, placed),
+                   "greedy_placed":    len(placed),
+                   "proven":           d not in todo,
+                   "decodes":          0}
+        if d in todo:
+            now = perf_counter()
+            share = now + max(0.0, deadline - now) / left
+            left -= 1
+            if stats is not None:
+                t = now
+            placed, unscheduled, summary["proven"], summary["decodes"] = improve_day(
+                keys, hour * 60 + minute, greedy[d], share)
+            if stats is not None:
+                stats.phases["search"] += perf_counter() - t
+        summary["objective"] = objective(keys, placed)
+        results.append((placed, unscheduled, summary))
+    return results, perf_counter() - searching
@@ -0,0 +1,171 @@
+"""
+Compact task context for LLM prompts.
+
+Sending every stored task as JSON makes prompts grow with the calendar.
+TaskContext instead lists only the tasks near the dates an instruction
+is about, one short table row each, summarizes the rest, and stops at a
+hard token budget. Rows carry short aliases (t1, t2, ...) instead of the
+task ids; resolve() maps them back in the model's actions.
+"""
+import json
+import os
+import re
+from collections import defaultdict
+from datetime import date, timedelta
+
+# hard cap on the context's estimated tokens
+TOKEN_BUDGET = int(os.getenv("LLM_CONTEXT_TOKENS", "1500"))
+
+# days around today listed when neither the request nor the prompt names dates
+DAYS_BEFORE = 1
+DAYS_AFTER  = 14
+
+CHARS_PER_TOKEN = 4
+TITLE_CHARS     = 40
+HEADER = "id|title|date|time|min|pri|repeat"
+PRIORITY_CODES = {"high": "h", "medium": "m", "low": "l"}
+# tasks serialized to estimate the full JSON dump's size from
+FULL_SAMPLE = 32
+
+_DATE_RE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+
+
+def estimate_tokens(text):
+    """Rough token count: about four characters per token for English and JSON."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _as_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def prompt_window(prompt, window=(None, None), today=None):
+    """
+    Dates an instruction is about: the request's own (start, end) when
+    given, else the span of the ISO dates in the prompt, else the days
+    around today.
+    """
+    today = today or date.today()
+    start, end = window
+    if start is None and end is None:
+        named = [d for d in map(_as_date, _DATE_RE.findall(prompt)) if d]
+        if named:
+            start, end = min(named), max(named)
+    start = start or min(today, end or today) - timedelta(days=DAYS_BEFORE)
+    end   = end or max(today, start) + timedelta(days=DAYS_AFTER)
+    return start, end
+
+
+def _cell(value):
+    return str(value).replace("|", "/").replace("\n", " ").strip()
+
+
+def _time(task):
+    if task.get("fixed"):
+        return task.get("start_time", "")
+    earliest, latest = task.get("earliest_time"), task.get("latest_time")
+    if earliest or latest:
+        return f"{earliest or ''}-{latest or ''}"
+    return ""
+
+
+def _repeat(task):
+    rule = task.get("recurrence")
+    if not rule:
+        return ""
+    days = rule.get("byweekday")
+    return rule.get("freq", "") + (":" + ",".join(days) if days else "")
+
+
+class TaskContext:
+    """
+    Budgeted table of the tasks relevant to one instruction.
+
+    Recurring tasks and tasks dated inside the window are listed, in date
+    and time order, until the next row would break `budget`; tasks outside
+    the window, and any the budget left out, become "#" summary lines of
+    counts and minutes. `text` goes into the prompt; `tokens` and
+    `full_tokens` (the old JSON dump of every task, scaled up from the
+    first FULL_SAMPLE tasks rather than serialized per request) measure
+    the saving.
+    """
+
+    def __init__(self, tasks, window, budget=None):
+        budget = TOKEN_BUDGET if budget is None else budget
+        start, end = window
+        self.window = window
+
+        listed, before, after = [], [], []
+        for task in tasks:
+            day = _as_date(task.get("date"))
+            if task.get("recurrence") or day is None or start <= day <= end:
+                listed.append((day or start, task))
+            elif day < start:
+                before.append((day, task))
+            else:
+                after.append((day, task))
+        listed.sort(key=lambda x: (x[0], not x[1].get("fixed"),
+                                   x[1].get("start_time") or x[1].get("earliest_time") or ""))
+
+        # summaries are always sent, so their room comes off the top
+        summaries = [self._summary("before", before), self._summary("after", after)]
+        summaries = [s for s in summaries if s]
+        used = estimate_tokens(HEADER) + sum(estimate_tokens(s) + 1 for s in summaries)
+        rows, costs = [HEADER], []
+        for n, (day, task) in enumerate(listed):
+            row = self._row(n + 1, day, task)
+            cost = estimate_tokens(row) + 1
+            if used + cost > budget:
+                # give back rows until the line counting the rest fits too
+                while True:
+                    rest = self._summary("unlisted", listed[len(costs):])
+                    if not costs or used + estimate_tokens(rest) + 1 <= budget:
+                        break
+                    rows.pop()
+                    used -= costs.pop()
+                summaries.append(rest)
+                break
+            used += cost
+            rows.append(row)
+            costs.append(cost)
+
+        self.aliases    = {f"t{n + 1}": listed[n][1].get("id") for n in range(len(costs))}
+        self.listed     = len(costs)
+        self.summarized = len(tasks) - self.listed
+        self.text = "\n".join(rows + summaries)
+        self.tokens      = estimate_tokens(self.text)
+        sample = tasks[:FULL_SAMPLE]
+        self.full_tokens = (estimate_tokens(json.dumps(sample, default=str))
+                            * len(tasks) // max(len(sample), 1))
+
+    def _row(self, n, day, task):
+        title = _cell(task.get("title", ""))[:TITLE_CHARS]
+        pri = PRIORITY_CODES.get(task.get("priority"), "")
+        return "|".join([f"t{n}", title, day.isoformat(), _time(task),
+                         str(task.get("duration", "")), pri, _repeat(task)])
+
+    @staticmethod
+    def _summary(label, items):
+        if not items:
+            return ""
+        days = [d for d, _ in items]
+        minutes = sum(int(t.get("duration") or 0) for _, t in items)
+        per_day = defaultdict(int)
+        for d in days:
+            per_day[d] += 1
+        busiest = max(per_day, key=per_day.get)
+        return (f"# {label}: {len(items)} tasks, {minutes} min, "
+                f"{min(days).isoformat()}..{max(days).isoformat()}, "
+                f"busiest {busiest.isoformat()} ({per_day[busiest]})")
+
+    def resolve(self, action):
+        """The action with an aliased task_id (t3) swapped for the real id."""
+        task_id = action.get("task_id")
+        if task_id in self.aliases:
+            return {**action, "task_id": self.aliases[task_id]}
+        return action
@@ -0,0 +1,90 @@
+from bisect import bisect_left
+from datetime import date, timedelta
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def _weekday(value):
+    if isinstance(value, int) and 0 <= value < 7:
+        return value
+    if isinstance(value, str) and value[:3].lower() in WEEKDAYS:
+        return WEEKDAYS.index(value[:3].lower())
+    raise ValueError(f"bad weekday {value!r}")
+
+
+def _as_date(value):
+    return value if isinstance(value, date) or value is None else date.fromisoformat(value)
+
+
+class Recurrence:
+    """
+    A task's repeat rule, read from the dict stored under task["recurrence"]:
+
+        freq        "daily", "weekly" or "weekdays" (weekly, Monday-Friday)
+        interval    every n days / weeks, default 1
+        byweekday   weekly only: e.g. ["mon", "thu"] (or 0-6); default is
+                    the weekday of the first occurrence
+        until       last possible date, inclusive
+        count       stop after this many occurrences
+        exceptions  ISO dates to skip (they still count towards `count`)
+
+    The task's own "date" is the first possible occurrence. Occurrences
+    are worked out arithmetically for whatever dates are asked about, so
+    a rule costs the same whether it runs for a week or for ever.
+    """
+    __slots__ = ("start", "freq", "interval", "weekdays", "until", "count", "exceptions")
+
+    def __init__(self, rule, start):
+        freq = rule.get("freq", "weekly")
+        if freq not in ("daily", "weekly", "weekdays"):
+            raise ValueError(f"unknown recurrence freq {freq!r}")
+        self.start    = start
+        self.freq     = "daily" if freq == "daily" else "weekly"
+        self.interval = int(rule.get("interval", 1))
+        if self.interval < 1:
+            raise ValueError("recurrence interval must be at least 1")
+        if freq == "weekdays":
+            self.weekdays = [0, 1, 2, 3, 4]
+        else:
+            self.weekdays = sorted({_weekday(d) for d in rule.get("byweekday") or [start.weekday()]})
+        self.until      = _as_date(rule.get("until"))
+        self.count      = rule.get("count")
+        self.exceptions = frozenset(_as_date(d) for d in rule.get("exceptions", ()))
+
+    def _index(self, day):
+        """Position of `day` in the series (ignoring until/count), or None."""
+        if self.freq == "daily":
+            n, off = divmod((day - self.start).days, self.interval)
+            return n if off == 0 else None
+        week, mod = divmod((day - self.start).days + self.start.weekday(), 7)
+        n, off = divmod(week, self.interval)
+        if off or mod not in self.weekdays:
+            return None
+        # the first week only has the weekdays from the start date on
+        pos   = bisect_left(self.weekdays, mod)
+        first = len(self.weekdays) - bisect_left(self.weekdays, self.start.weekday())
+        return pos - (len(self.weekdays) - first) if n == 0 else first + (n - 1) * len(self.weekdays) + pos
+
+    def occurs_on(self, day):
+        if day < self.start or (self.until is not None and day > self.until):
+            return False
+        if day in self.exceptions:
+            return False
+        n = self._index(day)
+        return n is not None and (self.count is None or n < self.count)
+
+    def between(self, lo, hi):
+        """Occurrence dates in [lo, hi], in order."""
+        lo = max(lo, self.start)
+        if self.until is not None:
+            hi = min(hi, self.until)
+        if self.freq == "daily":
+            # jump straight to the first aligned day
+            day = lo + timedelta(days=-(lo - self.start).days % self.interval)
+            step = timedelta(days=self.interval)
+        else:
+            day, step = lo, timedelta(days=1)
+        while day <= hi:
+            if self.occurs_on(day):
+                yield day
+            day += step
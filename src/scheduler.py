@@ -1,5 +1,219 @@
 from datetime import datetime, date, time, timedelta
+from bisect import insort
 from collections import defaultdict
+import heapq
+from time import perf_counter
+
+from intervals import IntervalIndex
+from recurrence import Recurrence
+
+PRIORITY_CODES = {"high": 0, "medium": 1, "low": 2}
+
+# days of recurring tasks schedule() expands when not given an end date
+RECURRENCE_HORIZON_DAYS = 28
+
+# seconds engine="optimal" may spend searching, per schedule() call
+DEFAULT_TIME_BUDGET = 0.2
+
+
+def parse_hhmm(s: str) -> int:
+    """Parse "HH:MM" into minutes since midnight."""
+    h, _, m = s.partition(":")
+    h, m = int(h), int(m)
+    if not (0 <= h < 24 and 0 <= m < 60):
+        raise ValueError(f"time {s!r} does not match format 'HH:MM'")
+    return h * 60 + m
+
+
+def format_hhmm(minutes: int) -> str:
+    """Render minutes since midnight as "HH:MM", wrapping past midnight."""
+    return f"{minutes // 60 % 24:02d}:{minutes % 60:02d}"
+
+
+class TaskRecord:
+    """
+    Compiled form of a task dict: minute-of-day offsets, duration and a
+    priority code, parsed once so the day solver never touches strings.
+    `earliest` is None when the task should start from the day's anchor.
+    """
+    __slots__ = ("task", "date", "start", "duration",
+                 "earliest", "latest", "priority", "fixed", "key")
+
+    def __init__(self, task, default_date):
+        day = task.get("date", default_date)
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        self.task     = task
+        self.date     = day
+        self.fixed    = bool(task.get("fixed"))
+        self.start    = parse_hhmm(task["start_time"]) if self.fixed else None
+        self.duration = task.get("duration", 60)
+        if isinstance(self.duration, bool) or not isinstance(self.duration, int) or self.duration <= 0:
+            raise ValueError(f"duration must be a positive whole number of minutes, not {self.duration!r}")
+        earliest      = task.get("earliest_time")
+        self.earliest = parse_hhmm(earliest) if earliest is not None else None
+        self.latest   = parse_hhmm(task.get("latest_time", "23:59"))
+        self.priority = PRIORITY_CODES.get(task.get("priority", "medium"), 1)
+        # everything the day solver looks at; equal keys => equal placement
+        self.key = (self.fixed, self.start, self.duration,
+                    self.earliest, self.latest, self.priority)
+
+    def as_task(self, day):
+        """The task dict as it stands on `day`; recurring tasks become one occurrence."""
+        task = {**self.task, "date": day.isoformat()}
+        if task.pop("recurrence", None) is not None:
+            task["series_id"] = task.get("id")
+            task["id"]        = f"{task.get('id')}@{task['date']}"
+        return task
+
+    def render(self, start, day):
+        """Emit the public dict form of this task placed at `start`."""
+        task = self.as_task(day) if "recurrence" in self.task else self.task
+        return {**task,
+                "start_time": format_hhmm(start),
+                "end_time":   format_hhmm(start + self.duration),
+                "date":       day.isoformat()}
+
+
+class SolveStats:
+    """
+    Opt-in solver instrumentation: seconds per phase plus gap probes and
+    evictions, in total and per solved day. solve_day only reads the
+    clock when it is handed one of these.
+    """
+    __slots__ = ("phases", "gap_probes", "evictions", "per_day")
+
+    def __init__(self):
+        self.phases     = defaultdict(float)
+        self.gap_probes = 0
+        self.evictions  = 0
+        self.per_day    = []   # (gap_probes, evictions) per solve_day call
+
+    def as_dict(self, days=None):
+        per_day = self.per_day
+        if days is not None:
+            per_day = [{"date": d.isoformat(), "gap_probes": p, "evictions": e}
+                       for d, (p, e) in zip(days, per_day)]
+        return {"phases_ms":  {k: round(v * 1000, 3) for k, v in self.phases.items()},
+                "gap_probes": self.gap_probes,
+                "evictions":  self.evictions,
+                "days":       per_day}
+
+
+def solve_day(keys, anchor, max_evictions=None, stats=None):
+    """
+    Schedule one day with windows and priority preemption.
+
+    Pure function of the day's TaskRecord keys and the anchor minute
+    (start of the day for tasks without an earliest_time), so days can be
+    solved independently and in any process.
+
+    A flexible task that finds no gap evicts placed flexible tasks of
+    strictly lower priority, lowest first, until it fits. Evicted tasks
+    are then re-placed the same way, so they can in turn push out
+    anything below them. max_evictions bounds the total evictions for
+    the day (default 4 per task).
+
+    Pass a SolveStats as `stats` to time the solver's phases.
+
+    Returns (placed, unscheduled): (start_minute, index) pairs in
+    chronological order, and the indices that could not be placed.
+    """
+    scheduled = {}   # index -> start minute, in placement order
+    blocked = IntervalIndex()
+    heap = []        # (-priority, seq, index): lowest priority on top
+    seq = 0
+    budget = 4 * len(keys) if max_evictions is None else max_evictions
+    probes = evictions = 0
+
+    find_gap = blocked.find_gap
+    if stats is not None:
+        started = perf_counter()
+        untimed = find_gap
+
+        def find_gap(dur, earliest, latest):
+            nonlocal probes
+            t = perf_counter()
+            found = untimed(dur, earliest, latest)
+            stats.phases["find_gap"] += perf_counter() - t
+            probes += 1
+            return found
+
+    def add_block(i, start):
+        nonlocal seq
+        blocked.add(start, start + keys[i][2], i)
+        scheduled[i] = start
+        if not keys[i][0]:
+            seq += 1
+            heapq.heappush(heap, (-keys[i][5], seq, i))
+
+    # fixed tasks
+    for i, (fixed, start, *_) in enumerate(keys):
+        if fixed:
+            add_block(i, start)
+    if stats is not None:
+        stats.phases["fixed"] += perf_counter() - started
+
+    def window(i):
+        _, _, dur, earliest, latest, _ = keys[i]
+        return dur, (anchor if earliest is None else earliest), latest
+
+    def place(i):
+        nonlocal budget, evictions
+        dur, earliest, latest = window(i)
+        start = find_gap(dur, earliest, latest)
+
+        evicted = []
+        while start is None and budget > 0 and heap and -heap[0][0] > keys[i][5]:
+            if stats is not None:
+                t = perf_counter()
+            _, _, j = heapq.heappop(heap)
+            st = scheduled.pop(j)
+            blocked.remove(st, st + keys[j][2], j)
+            evicted.append(j)
+            budget -= 1
+            evictions += 1
+            if stats is not None:
+                stats.phases["evict"] += perf_counter() - t
+            start = find_gap(dur, earliest, latest)
+
+        if start is not None:
+            add_block(i, start)
+        # bounded re-placement of the displaced work, most important first
+        for j in sorted(evicted, key=flex_order):
+            place(j)
+        return start is not None
+
+    # flexible tasks sorted by priority then earliest_time
+    def flex_order(i):
+        return keys[i][5], keys[i][3] or 0
+
+    if stats is not None:
+        t = perf_counter()
+    flex = [i for i, k in enumerate(keys) if not k[0]]
+    flex.sort(key=flex_order)
+    if stats is not None:
+        stats.phases["flex_sort"] += perf_counter() - t
+    for i in flex:
+        place(i)
+
+    if stats is not None:
+        t = perf_counter()
+    placed = sorted(((st, i) for i, st in scheduled.items()), key=lambda x: x[0])
+    unscheduled = [i for i in range(len(keys)) if i not in scheduled]
+    if stats is not None:
+        stats.phases["final_sort"] += perf_counter() - t
+        stats.gap_probes += probes
+        stats.evictions  += evictions
+        stats.per_day.append((probes, evictions))
+    return placed, unscheduled
+
+
+def _solve_day_key(day_key, stats=None):
+    """Process-pool entry point: solve a day from its schedule() cache key."""
+    (hour, minute), keys = day_key
+    return solve_day(keys, hour * 60 + minute, stats=stats)
+
 
 class Scheduler:
     def __init__(self, base_time=None):
@@ -7,28 +221,104 @@ class Scheduler:
         self.base_time = base_time or datetime.now().replace(
             hour=9, minute=0, second=0, microsecond=0
         )
+        # recurring tasks default to RECURRENCE_HORIZON_DAYS from this day;
+        # kept apart because schedule() moves base_time to its last day.
+        # anchor() moves both.
+        self.horizon_start = self.base_time.date()
         self.tasks = []
-        self.blocked_times = []
+        self.records = []   # compiled TaskRecord per entry in self.tasks
+        # recurring tasks, kept once as (Recurrence, TaskRecord) and only
+        # expanded into days when schedule() needs them
+        self.series = []
+        # date -> sorted (start, end) minutes of that day's fixed tasks
+        self._fixed_by_date = defaultdict(list)
+        # date -> (content key, [(start, index into that day's records)])
+        self._day_cache = {}
+        self._cache_engine = "greedy"
+        self.solved_days = []   # days actually re-solved by the last schedule()
+        self.unscheduled = []   # tasks the last schedule() could not place
+        # engine="optimal" only: objective and placed counts vs greedy
+        self.optimizer_report = None
+        # set to a SolveStats to have schedule() record phase timings into it
+        self.profile = None
+
+    def copy(self):
+        """
+        Independent Scheduler over the same tasks, for trying edits (such
+        as goals) without touching this one. Day results cached so far
+        carry over, so only days the copy changes get solved again.
+        """
+        other = Scheduler(base_time=self.base_time)
+        other.horizon_start = self.horizon_start
+        other.tasks   = list(self.tasks)
+        other.records = list(self.records)
+        other.series  = list(self.series)
+        other._fixed_by_date = defaultdict(list, {d: list(v) for d, v in self._fixed_by_date.items()})
+        other._day_cache     = dict(self._day_cache)
+        other._cache_engine  = self._cache_engine
+        return other
+
+    def anchor(self, base_time):
+        """
+        Start scheduling from base_time, recurring tasks' default horizon
+        included. Setting base_time alone leaves the horizon where it was.
+        """
+        self.base_time     = base_time
+        self.horizon_start = base_time.date()
 
     def add_task(self, task):
-        """Add a task dict and tag it with a date if missing."""
+        """
+        Add a task dict, tagged with today's date if it has none. A task
+        with a "recurrence" rule (see recurrence.Recurrence) repeats from
+        its date. The dict is shared with copies of this Scheduler, so it
+        is never changed in place; untagged ones are copied.
+        """
         if "date" not in task:
-            task["date"] = self.base_time.date()
+            task = {**task, "date": self.base_time.date()}
+        rec = TaskRecord(task, self.base_time.date())
+        if task.get("recurrence"):
+            self.series.append((Recurrence(task["recurrence"], rec.date), rec))
+            return
+        if rec.fixed:
+            insort(self._fixed_by_date[rec.date], (rec.start, rec.start + rec.duration))
+        self.records.append(rec)
         self.tasks.append(task)
 
     def remove_task(self, task_id):
         """Remove task by id."""
-        self.tasks = [t for t in self.tasks if t.get("id") != task_id]
+        keep = []
+        for i, t in enumerate(self.tasks):
+            if t.get("id") != task_id:
+                keep.append(i)
+                continue
+            rec = self.records[i]
+            if rec.fixed:
+                self._fixed_by_date[rec.date].remove((rec.start, rec.start + rec.duration))
+        self.tasks   = [self.tasks[i] for i in keep]
+        self.records = [self.records[i] for i in keep]
+        self.series  = [s for s in self.series if s[1].task.get("id") != task_id]
 
     def move_task(self, task_id, earliest_time=None, latest_time=None):
-        """Update a task's window and reschedule later."""
-        for t in self.tasks:
+        """Give a task a new window (as a new dict) and reschedule later."""
+        window = {k: v for k, v in (("earliest_time", earliest_time),
+                                    ("latest_time", latest_time)) if v is not None}
+        for i, t in enumerate(self.tasks):
             if t.get("id") == task_id:
-                if earliest_time is not None:
-                    t["earliest_time"] = earliest_time
-                if latest_time is not None:
-                    t["latest_time"] = latest_time
+                self.tasks[i]   = t = {**t, **window}
+                self.records[i] = TaskRecord(t, self.base_time.date())
                 break
+        for i, (rule, rec) in enumerate(self.series):
+            if rec.task.get("id") == task_id:
+                self.series[i] = (rule, TaskRecord({**rec.task, **window}, rec.date))
+
+    def keep_results(self, other):
+        """
+        Adopt the day results `other`, a copy of this Scheduler, has
+        solved since, so later copies start warm. Only swaps the cache
+        reference, which is safe while other threads copy this one.
+        """
+        if other._cache_engine == self._cache_engine:
+            self._day_cache = other._day_cache
 
     def add_goal_hybrid(self, title, total_minutes, max_block_size,
                         rest_between=0, priority="medium"):
@@ -36,60 +326,44 @@ class Scheduler:
         Fill today's free gaps up to max_block_size, optionally inserting
         rest_between minutes between each goal block.
         """
-        # 1) Gather & sort today's fixed blocks
-        fixed = []
-        for t in self.tasks:
-            if t.get("fixed") and t["date"] == self.base_time.date():
-                # anchor to today's base_time
-                st = datetime.strptime(t["start_time"], "%H:%M")
-                st = self.base_time.replace(hour=st.hour, minute=st.minute)
-                en = st + timedelta(minutes=t["duration"])
-                fixed.append((st, en))
-        fixed.sort(key=lambda x: x[0])
-
-        # 2) Fill gaps
+        # 1) Today's fixed blocks, already sorted by the date index
+        day    = self.base_time.date()
+        fixed  = self._fixed_on(day)
+
+        # 2) Fill gaps, walking a minute-of-day cursor from base_time
         remaining = total_minutes
-        cursor = self.base_time
+        cursor    = self.base_time.hour * 60 + self.base_time.minute
 
-        def emit_block(mins):
+        def emit(task_title, mins, task_priority):
             self.add_task({
-                "title":    title,
+                "title":    task_title,
                 "duration": mins,
-                "priority": priority,
+                "priority": task_priority,
                 "fixed":    False,
-                "date":     cursor.date()
-            })
-
-        def emit_rest():
-            self.add_task({
-                "title":    "Rest",
-                "duration": rest_between,
-                "priority": "low",
-                "fixed":    False,
-                "date":     cursor.date()
+                "date":     day + timedelta(days=cursor // 1440)
             })
 
         # before & between fixed
         for st, en in fixed:
-            gap = int((st - cursor).total_seconds() // 60)
+            gap = st - cursor
             while remaining > 0 and gap > 0:
                 block = min(max_block_size, remaining, gap)
-                emit_block(block)
+                emit(title, block, priority)
                 remaining -= block
                 gap       -= block
                 if rest_between and remaining > 0:
-                    emit_rest()
-                    cursor += timedelta(minutes=rest_between)
+                    emit("Rest", rest_between, "low")
+                    cursor += rest_between
             cursor = max(cursor, en)
 
         # after last fixed
         while remaining > 0:
             block = min(max_block_size, remaining)
-            emit_block(block)
+            emit(title, block, priority)
             remaining -= block
             if rest_between and remaining > 0:
-                emit_rest()
-                cursor += timedelta(minutes=rest_between)
+                emit("Rest", rest_between, "low")
+                cursor += rest_between
 
     def add_goal_periodic(self, title, total_minutes, max_block_size,
                           start_date: date, end_date: date,
@@ -98,23 +372,18 @@ class Scheduler:
         Spread total_minutes evenly across each day in [start_date, end_date],
         using the hybrid helper each day and injecting rest_between.
         """
-        # list of days
-        days = []
-        d = start_date
-        while d <= end_date:
-            days.append(d)
-            d += timedelta(days=1)
-
-        # compute daily quotas
-        per_day   = total_minutes // len(days)
-        remainder = total_minutes % len(days)
+        # compute daily quotas without materialising the days
+        n_days = (end_date - start_date).days + 1
+        if n_days < 1:
+            raise ValueError("end_date is before start_date")
+        per_day, remainder = divmod(total_minutes, n_days)
 
+        days = (start_date + timedelta(days=i) for i in range(n_days))
         for i, day in enumerate(days):
             # assign extra minute to first few days
             daily = per_day + (1 if i < remainder else 0)
             # anchor to that day at 9:00
-            self.base_time     = datetime.combine(day, time(9,0))
-            self.blocked_times = []
+            self.base_time = datetime.combine(day, time(9,0))
             # call hybrid for that slice
             self.add_goal_hybrid(
                 title=title,
@@ -124,111 +393,175 @@ class Scheduler:
                 priority=priority
             )
 
+    def _fixed_on(self, day):
+        """Sorted (start, end) minutes of the fixed blocks on `day`, recurring ones included."""
+        fixed = self._fixed_by_date.get(day, [])
+        extra = [(r.start, r.start + r.duration) for rule, r in self.series
+                 if r.fixed and rule.occurs_on(day)]
+        return sorted(fixed + extra) if extra else fixed
+
     def _priority_value(self, p: str) -> int:
-        return {"high": 0, "medium": 1, "low": 2}.get(p, 1)
-
-    def _find_gap(self, dur: int, earliest: datetime, latest: datetime):
-        """Find earliest available start between earliest and latest."""
-        candidate = earliest
-        for st, en, _ in sorted(self.blocked_times, key=lambda x: x[0]):
-            if candidate + timedelta(minutes=dur) <= st:
-                if candidate + timedelta(minutes=dur) <= latest:
-                    return candidate
-            candidate = max(candidate, en)
-            if candidate > latest:
-                break
-        if candidate + timedelta(minutes=dur) <= latest:
-            return candidate
-        return None
-
-    def _schedule_day(self, tasks_for_day):
-        """Schedule tasks for a single day with windows and sliding."""
-        scheduled = []
-        self.blocked_times = []
-
-        def add_block(task, start):
-            dur = task.get("duration", 60)
-            end = start + timedelta(minutes=dur)
-            record = {**task, "start_time": start.strftime("%H:%M"),
-                      "end_time": end.strftime("%H:%M")}
-            self.blocked_times.append((start, end, record))
-            scheduled.append(record)
-
-        # fixed tasks
-        for t in tasks_for_day:
-            if t.get("fixed"):
-                st = datetime.strptime(t["start_time"], "%H:%M")
-                st = self.base_time.replace(hour=st.hour, minute=st.minute)
-                add_block(t, st)
-
-        # flexible tasks sorted by priority then earliest_time
-        flex = [t for t in tasks_for_day if not t.get("fixed")]
-        flex.sort(key=lambda x: (self._priority_value(x.get("priority", "medium")),
-                                 x.get("earliest_time", "00:00")))
-
-        def slot_task(task, allow_slide=True):
-            dur = task.get("duration", 60)
-            earliest = datetime.strptime(task.get("earliest_time", self.base_time.strftime("%H:%M")), "%H:%M")
-            earliest = self.base_time.replace(hour=earliest.hour, minute=earliest.minute)
-            latest_s = task.get("latest_time", "23:59")
-            latest = datetime.strptime(latest_s, "%H:%M")
-            latest = self.base_time.replace(hour=latest.hour, minute=latest.minute)
-            latest -= timedelta(minutes=dur)
-            start = self._find_gap(dur, earliest, latest)
-            if start:
-                add_block(task, start)
-                return True
-            if allow_slide:
-                return slide_and_reschedule(task, earliest, latest)
-            return False
-
-        def slide_and_reschedule(task, earliest, latest):
-            dur = task.get("duration", 60)
-            removed = []
-            for bt in sorted(self.blocked_times, key=lambda x: self._priority_value(x[2].get("priority", "medium")), reverse=True):
-                st, en, rec = bt
-                if rec.get("fixed"):
-                    continue
-                if self._priority_value(rec.get("priority", "medium")) <= self._priority_value(task.get("priority", "medium")):
-                    continue
-                self.blocked_times.remove(bt)
-                scheduled.remove(rec)
-                removed.append(rec)
-                start = self._find_gap(dur, earliest, latest)
-                if start:
-                    add_block(task, start)
-                    for r in removed:
-                        slot_task(r, allow_slide=False)
-                    return True
-            for r in removed:
-                slot_task(r, allow_slide=False)
-            return False
-
-        for t in flex:
-            slot_task(t)
-
-        scheduled.sort(key=lambda x: datetime.strptime(x["start_time"], "%H:%M"))
-        return scheduled
-
-    def schedule(self):
-        """
-        Group all tasks by their 'date', run _schedule_day on each,
+        return PRIORITY_CODES.get(p, 1)
+
+    def _schedule_day(self, records):
+        """
+        Schedule one day's TaskRecords against the current anchor.
+        Returns (start_minute, record) pairs in chronological order and
+        the records that could not be placed.
+        """
+        anchor = self.base_time.hour * 60 + self.base_time.minute
+        placed, unscheduled = solve_day([r.key for r in records], anchor)
+        return [(st, records[i]) for st, i in placed], [records[i] for i in unscheduled]
+
+    def schedule(self, parallel=False, max_workers=None, engine="greedy", window=None,
+                 time_budget=DEFAULT_TIME_BUDGET, spillover=False):
+        """
+        Group all tasks by their 'date', solve each day,
         and return a combined, chronological schedule.
+
+        window=(start_date, end_date) limits the schedule to those days
+        (either end may be None). Recurring tasks are expanded only over
+        the window, which for them defaults to RECURRENCE_HORIZON_DAYS
+        from self.horizon_start (the anchor's day when constructed).
+
+        Each day's placement is cached under a key built from its tasks'
+        scheduling fields, so only days whose task set changed since the
+        last call are solved again. With parallel=True those days are
+        solved on a process pool of max_workers and merged in date order.
+
+        engine="optimal" starts from the greedy result and searches for
+        placements that fit more priority-weighted work (see optimal.py)
+        for at most time_budget seconds. The budget bounds the search
+        only: the greedy pass and rendering cost what they do for
+        engine="greedy", on top. self.optimizer_report then compares the
+        result with greedy. It also ignores parallel.
+
+        spillover=True carries flexible tasks their day couldn't fit to the
+        earliest gap on a later day, up to the task's "deadline" date (see
+        horizon.py). Moved blocks are tagged with "spilled_from".
+
+        Tasks that could not be placed are left in self.unscheduled.
+        With self.profile set to a SolveStats, phase timings and per-day
+        probe/eviction counts accumulate there (in-process solves only).
         """
+        called = perf_counter()
+        stats  = self.profile
+        if stats is not None:
+            t = called
+        start, end = window or (None, None)
         by_date = defaultdict(list)
-        for t in self.tasks:
-            by_date[t.get("date", self.base_time.date())].append(t)
+        if start is None and end is None:
+            for r in self.records:
+                by_date[r.date].append(r)
+        else:
+            lo, hi = start or date.min, end or date.max
+            for r in self.records:
+                if lo <= r.date <= hi:
+                    by_date[r.date].append(r)
+        if self.series:
+            first = start or self.horizon_start
+            last  = end or first + timedelta(days=RECURRENCE_HORIZON_DAYS - 1)
+            for rule, r in self.series:
+                # one shared record per series; the day is supplied at render time
+                for day in rule.between(first, last):
+                    by_date[day].append(r)
+
+        anchor = (self.base_time.hour, self.base_time.minute)
+        # an optimal result only stands for the budget it was searched with
+        cache_engine = (engine, time_budget) if engine == "optimal" else engine
+        cache, self._day_cache = self._day_cache, {}
+        if cache_engine != self._cache_engine:
+            cache = {}
+        elif window is not None:
+            # days outside the window keep their results for later calls
+            self._day_cache = dict(cache)
+        self._cache_engine = cache_engine
+        days = sorted(by_date)
+
+        # work out which days changed since the last call
+        dirty = []
+        for day in days:
+            key = (anchor, tuple(r.key for r in by_date[day]))
+            cached = cache.get(day)
+            if cached is not None and cached[0] == key:
+                self._day_cache[day] = cached
+            else:
+                self._day_cache[day] = (key, None)
+                dirty.append(day)
+
+        day_keys = [self._day_cache[d][0] for d in dirty]
+        if stats is not None:
+            stats.phases["day_keys"] += perf_counter() - t
+            t = perf_counter()
+        if engine == "optimal":
+            from optimal import solve_days
+            solved, searched = solve_days(day_keys, time_budget, stats=stats)
+        elif engine != "greedy":
+            raise ValueError(f"Unknown scheduling engine: {engine}")
+        elif parallel and len(dirty) > 1:
+            import os
+            from concurrent.futures import ProcessPoolExecutor
+            workers = max_workers or os.cpu_count() or 1
+            chunk = max(1, len(dirty) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                solved = list(pool.map(_solve_day_key, day_keys, chunksize=chunk))
+        else:
+            solved = [_solve_day_key(k, stats) for k in day_keys]
+        for day, key, result in zip(dirty, day_keys, solved):
+            self._day_cache[day] = (key, result)
+        self.solved_days = dirty
+        if stats is not None:
+            stats.phases["solve"] += perf_counter() - t
+            t = perf_counter()
+
+        moved, left = {}, None
+        if spillover and days:
+            from horizon import spill
+            moved, left = spill(by_date, {d: self._day_cache[d][1] for d in days},
+                                anchor[0] * 60 + anchor[1], end)
+            if stats is not None:
+                stats.phases["spill"] += perf_counter() - t
+                t = perf_counter()
 
         full = []
-        for day in sorted(by_date):
-            # reset anchor
-            self.base_time = datetime.combine(day, self.base_time.timetz())
-            day_sched = self._schedule_day(by_date[day])
-            # tag each with date for clarity
-            for item in day_sched:
-                item["date"] = day.isoformat()
-            full.extend(day_sched)
-
-        # final sort by date+time
-        full.sort(key=lambda x: (x["date"], x["start_time"]))
+        self.unscheduled = []
+        for day in (sorted(set(days).union(moved)) if moved else days):
+            records = by_date.get(day, ())
+            placed, unscheduled = self._day_cache[day][1][:2] if records else ((), ())
+            if left is not None:
+                unscheduled = left.get(day, ())
+            # render back to dicts, tagged with the date for clarity
+            if day in moved:
+                blocks = [(st, records[i].render(st, day)) for st, i in placed]
+                blocks.extend((st, {**r.render(st, day), "spilled_from": origin.isoformat()})
+                              for st, r, origin in moved[day])
+                blocks.sort(key=lambda b: b[0])
+                full.extend(b for _, b in blocks)
+            else:
+                full.extend(records[i].render(st, day) for st, i in placed)
+            self.unscheduled.extend(records[i].as_task(day) for i in unscheduled)
+
+        if stats is not None:
+            stats.phases["render"] += perf_counter() - t
+
+        self.optimizer_report = None
+        if engine == "optimal":
+            summaries = [self._day_cache[day][1][2] for day in days]
+            self.optimizer_report = {
+                "objective":        sum(s["objective"] for s in summaries),
+                "greedy_objective": sum(s["greedy_objective"] for s in summaries),
+                "placed":           len(full),
+                "greedy_placed":    sum(s["greedy_placed"] for s in summaries),
+                "proven_optimal":   all(s["proven"] for s in summaries),
+                "decodes":          sum(s["decodes"] for s in summaries),
+                "elapsed_ms":       round((perf_counter() - called) * 1000, 3),
+                "search_ms":        round(searched * 1000, 3),
+                "budget_ms":        round(time_budget * 1000, 3),
+            }
+
+        if days:
+            # leave the anchor on the last day, as the serial loop used to
+            self.base_time = datetime.combine(days[-1], self.base_time.timetz())
+
+        # days are visited in order and each day is already chronological
         return full
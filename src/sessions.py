@@ -0,0 +1,406 @@
+import hashlib
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+from scheduler import Scheduler
+
+log = logging.getLogger(__name__)
+
+# snapshot ids and session epochs are unique per process, and the prefix
+# keeps ids handed out before a restart (or before a session was evicted)
+# from matching anything later
+_BOOT         = uuid.uuid4().hex[:8]
+_snapshot_ids = itertools.count(1)
+
+# window of a session nobody has read a schedule from yet; those aren't precomputed
+_UNREAD = object()
+
+
+def block_key(block):
+    """
+    Identity of a scheduled block across schedules: its task id, or for
+    id-less blocks (goal pieces) its date, start time and title.
+    """
+    return block.get("id") or f"{block['date']}T{block['start_time']} {block.get('title', '')}"
+
+
+def diff_schedules(old, new):
+    """
+    What changed between two scheduled lists: blocks added, keys of the
+    blocks removed, and blocks that kept their key but moved or changed.
+    """
+    before = {block_key(b): b for b in old}
+    after  = {block_key(b): b for b in new}
+    return {
+        "added":   [b for k, b in after.items() if k not in before],
+        "removed": [k for k in before if k not in after],
+        "moved":   [b for k, b in after.items() if k in before and before[k] != b],
+    }
+
+
+def _today_anchor():
+    # same default a fresh Scheduler() picks: today at 9:00 AM
+    return datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
+
+
+class CalendarSession:
+    """
+    One calendar's warm state: its store, a Scheduler holding all of its
+    tasks, and the last schedule computed from them.
+
+    The Scheduler is published copy-on-write: `state` is a
+    (version, Scheduler) pair that is never modified once published.
+    Edits copy the current Scheduler, change the copy and publish it as
+    the next version in one assignment, so readers just take `state`
+    and work from a consistent version without any lock; only writers
+    wait for each other. Task dicts are shared between versions and
+    never changed in place.
+
+    With a Precomputer, each published version is also solved in the
+    background (for the window last read), so the next read usually
+    finds its schedule ready, or waits for the run already under way.
+
+    Every schedule sent to a client is kept as a numbered snapshot (the
+    last `max_snapshots` of them) so the next request can be answered
+    with a diff against it.
+
+    Other processes may write the same store. `revision` is the store
+    revision the Scheduler reflects; refresh() (run by SessionCache.get)
+    and every write batch reload the tasks when the store has moved on.
+    """
+
+    max_snapshots = 16
+
+    def __init__(self, calendar_id, store, precomputer=None):
+        self.calendar_id = calendar_id
+        self.store       = store
+        self.epoch       = f"{_BOOT}.{next(_snapshot_ids)}"
+        self.precomputer = precomputer
+        self.edited_at   = time.monotonic()
+        self.evicted     = False   # dropped from its SessionCache; not precomputed
+        self._write_lock = threading.RLock()
+        self._batching   = False
+        self._draft      = None   # copy being edited by the writer holding the lock
+        self._last       = None   # (version, window, scheduled, unscheduled)
+        self._running    = None   # (version, window, Event) of a background solve
+        self._read_window = _UNREAD
+        self._snapshots  = OrderedDict()   # snapshot id -> scheduled list
+        self._snapshot_lock = threading.Lock()
+        self.skipped = []   # (task id, error)
+        # read first: a write landing before the load only makes us reload
+        self.revision = store.revision()
+        self.state = (0, self._load())
+
+    def _load(self):
+        """
+        Scheduler over everything in the store. Rows the scheduler can't
+        compile are left out (and listed) rather than making the whole
+        calendar unloadable.
+        """
+        skipped, scheduler = [], Scheduler()
+        for t in self.store.load():
+            try:
+                scheduler.add_task(t)
+            except (ValueError, TypeError, KeyError, AttributeError) as e:
+                skipped.append((t.get("id"), f"{type(e).__name__}: {e}"))
+        if skipped:
+            log.warning("Calendar %r: skipped %d unusable task(s): %s",
+                        self.calendar_id, len(skipped), skipped[:5])
+        self.skipped = skipped
+        return scheduler
+
+    def refresh(self):
+        """
+        Reload if another process wrote the store since this session
+        last looked. Returns whether it did.
+        """
+        if self.store.revision() == self.revision:
+            return False
+        with self.writing():
+            pass   # writing() reloads a stale session before anything else
+        return True
+
+    @property
+    def version(self):
+        return self.state[0]
+
+    @property
+    def scheduler(self):
+        """The current Scheduler. Read-only: edit through edit() or writing()."""
+        return self.state[1]
+
+    @contextmanager
+    def writing(self):
+        """
+        Collect every edit() made inside the block (by this thread) into
+        one new version, published when the block exits normally. The
+        block runs in one store batch(); if it raises, the edits are
+        thrown away as the batch rolls back. Blocks nest.
+
+        The batch holds the store's write lock, so a session behind the
+        store is reloaded first and the edits apply to the current tasks.
+        """
+        with self._write_lock:
+            if self._batching:
+                yield
+                return
+            self._batching = True
+            try:
+                with self.store.batch():
+                    revision = self.store.revision()
+                    if revision != self.revision:
+                        self._draft = self._load()
+                    yield
+                    revision = self.store.revision()
+            except BaseException:
+                self._draft = None
+                raise
+            finally:
+                self._batching = False
+            self.revision = revision
+            draft, self._draft = self._draft, None
+            if draft is not None:
+                self._publish(draft)
+
+    def edit(self, fn):
+        """Apply fn(scheduler) to a copy of the current Scheduler and publish it."""
+        with self.writing():
+            if self._draft is None:
+                self._draft = self.scheduler.copy()
+            fn(self._draft)
+
+    def reset(self):
+        """Publish an empty Scheduler as the next version."""
+        with self.writing():
+            self._draft = Scheduler()
+
+    def _publish(self, scheduler):
+        self.state = (self.version + 1, scheduler)
+        self.edited_at = time.monotonic()
+        if self.precomputer is not None and self._read_window is not _UNREAD:
+            self.precomputer.submit(self)
+
+    def etag(self, variant=""):
+        """Validator for anything derived from the stored tasks at this version."""
+        state = f"{self.epoch}:{self.version}:{variant}"
+        return hashlib.sha1(state.encode()).hexdigest()
+
+    def fork(self):
+        """Private copy of the current Scheduler, anchored at today 9:00."""
+        scheduler = self.scheduler.copy()
+        scheduler.anchor(_today_anchor())
+        return scheduler
+
+    def schedule(self, window=None):
+        """
+        (scheduled, unscheduled) for the current tasks, reusing the last
+        run, or waiting for a run of this version already under way.
+        """
+        self._read_window = window
+        version, current = self.state
+        return self._cached(version, window) or self._solve(version, current, window, wait=True)
+
+    def precompute(self):
+        """
+        Solve the current version for the window last read, unless that
+        is already done or under way. Returns whether it solved anything.
+        """
+        version, current = self.state
+        window = self._read_window
+        if window is _UNREAD or self._cached(version, window):
+            return False
+        return self._solve(version, current, window, wait=False) is not None
+
+    def _cached(self, version, window):
+        last = self._last
+        if last is not None and last[:2] == (version, window):
+            return last[2], last[3]
+        return None
+
+    def _solve(self, version, current, window, wait):
+        running = self._running
+        if running is not None and running[:2] == (version, window):
+            # someone is on it already: wait for theirs, or leave it to them
+            if not wait:
+                return None
+            running[2].wait()
+            if self.precomputer is not None:
+                self.precomputer.count("waits")
+            cached = self._cached(version, window)
+            if cached:
+                return cached
+        claim = self._running = (version, window, threading.Event())
+        try:
+            # on a private copy; its day results go back to the published
+            # Scheduler so the next version starts warm
+            scheduler = current.copy()
+            scheduler.anchor(_today_anchor())
+            scheduled = scheduler.schedule(window=window)
+            current.keep_results(scheduler)
+            self._last = (version, window, scheduled, scheduler.unscheduled)
+            return scheduled, scheduler.unscheduled
+        finally:
+            if self._running is claim:
+                self._running = None
+            claim[2].set()
+
+    def snapshot(self, scheduled):
+        """Number a scheduled list for later diffs; a repeat of the last one keeps its number."""
+        with self._snapshot_lock:
+            if self._snapshots:
+                last_id, last = next(reversed(self._snapshots.items()))
+                if last is scheduled:
+                    return last_id
+            snapshot_id = f"{_BOOT}.{next(_snapshot_ids)}"
+            self._snapshots[snapshot_id] = scheduled
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+            return snapshot_id
+
+    def since(self, snapshot_id):
+        """The scheduled list sent as snapshot_id, or None if it has been dropped."""
+        with self._snapshot_lock:
+            return self._snapshots.get(snapshot_id)
+
+
+class Precomputer:
+    """
+    Background thread that solves each edited session's schedule ahead
+    of its next read (see CalendarSession.precompute).
+
+    Edits coalesce: a session queued again before its run starts is
+    queued once, and a run waits until its session has gone `delay`
+    seconds without an edit, so a burst of edits costs one solve.
+    Sessions are served in the order they were first queued. Sessions
+    evicted from the cache are dropped from the queue (see discard).
+    """
+
+    def __init__(self, delay=0.02):
+        self.delay    = delay
+        self._pending = OrderedDict()   # session -> None, oldest first
+        self._busy    = False
+        self._cond    = threading.Condition()
+        self._thread  = None
+        self._counts  = {"runs": 0, "coalesced": 0, "waits": 0, "errors": 0, "dropped": 0}
+
+    def submit(self, session):
+        with self._cond:
+            if session.evicted:
+                return
+            if session in self._pending:
+                self._counts["coalesced"] += 1
+                return
+            self._pending[session] = None
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="precompute", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def discard(self, session):
+        """Forget a queued session; nobody will read its schedule now."""
+        with self._cond:
+            if session in self._pending:
+                del self._pending[session]
+                self._counts["dropped"] += 1
+                self._cond.notify_all()
+
+    def count(self, name):
+        with self._cond:
+            self._counts[name] += 1
+
+    def stats(self):
+        with self._cond:
+            return {**self._counts, "pending": len(self._pending)}
+
+    def wait_idle(self, timeout=None):
+        """Block until nothing is queued or running; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                session = next(iter(self._pending))
+                self._busy = True
+                # stay queued (so more edits coalesce) until the burst settles
+                while session in self._pending:
+                    quiet = time.monotonic() - session.edited_at
+                    if quiet >= self.delay:
+                        break
+                    self._cond.wait(self.delay - quiet)
+                if session not in self._pending:
+                    # discarded while it waited
+                    self._busy = False
+                    self._cond.notify_all()
+                    continue
+                del self._pending[session]
+            try:
+                ran = session.precompute()
+            except Exception:
+                # bad task data; the next read reports it
+                ran = False
+                self.count("errors")
+            with self._cond:
+                self._counts["runs"] += ran
+                self._busy = False
+                self._cond.notify_all()
+
+
+class SessionCache:
+    """
+    Bounded LRU of CalendarSessions. A calendar evicted for being idle
+    is simply rebuilt from its store the next time it is asked for.
+    With precompute=True the sessions share one background Precomputer.
+    """
+
+    def __init__(self, open_store, max_sessions=128, precompute=False):
+        self.open_store   = open_store
+        self.max_sessions = max_sessions
+        self.precomputer  = Precomputer() if precompute else None
+        self._sessions    = OrderedDict()
+        self._lock        = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, calendar_id):
+        with self._lock:
+            session = self._sessions.get(calendar_id)
+            if session is not None:
+                self._sessions.move_to_end(calendar_id)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if session is not None:
+            # pick up writes other processes made to the store
+            session.refresh()
+            return session
+
+        # build outside the cache lock; loading a big calendar takes a while
+        session = CalendarSession(calendar_id, self.open_store(calendar_id), self.precomputer)
+        with self._lock:
+            # another thread may have built it meanwhile; keep the first
+            session = self._sessions.setdefault(calendar_id, session)
+            self._sessions.move_to_end(calendar_id)
+            while len(self._sessions) > self.max_sessions:
+                _, evicted = self._sessions.popitem(last=False)
+                evicted.evicted = True
+                if self.precomputer is not None:
+                    self.precomputer.discard(evicted)
+                self.evictions += 1
+        return session
+
+    def stats(self):
+        with self._lock:
+            stats = {"size": len(self._sessions), "hits": self.hits,
+                     "misses": self.misses, "evictions": self.evictions,
+                     # unusable rows left out of the cached calendars
+                     "skipped_tasks": sum(len(s.skipped) for s in self._sessions.values())}
+        if self.precomputer is not None:
+            stats.update({f"precompute_{k}": v for k, v in self.precomputer.stats().items()})
+        return stats
@@ -1,15 +1,34 @@
 document.addEventListener('DOMContentLoaded', function() {
     var calendarEl = document.getElementById('calendar');
 
+    // Last schedule received, keyed like the server's diffs, so refetches
+    // only transfer what changed since scheduleVersion
+    var scheduleVersion = null;
+    var blocks = {};
+
+    function blockKey(item) {
+        return item.id || (item.date + 'T' + item.start_time + ' ' + (item.title || ''));
+    }
+
     function fetchEvents(fetchInfo, successCallback, failureCallback) {
         fetch('/schedule', {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({})
+            body: JSON.stringify(scheduleVersion ? {since: scheduleVersion} : {})
         })
         .then(resp => resp.json())
         .then(data => {
-            var events = (data.scheduled || []).map(function(item) {
+            if (data.delta) {
+                data.delta.removed.forEach(function(key) { delete blocks[key]; });
+                data.delta.added.concat(data.delta.moved).forEach(function(item) {
+                    blocks[blockKey(item)] = item;
+                });
+            } else {
+                blocks = {};
+                (data.scheduled || []).forEach(function(item) { blocks[blockKey(item)] = item; });
+            }
+            scheduleVersion = data.version;
+            var events = Object.values(blocks).map(function(item) {
                 var start = item.date + 'T' + item.start_time;
                 var end = item.date + 'T' + item.end_time;
                 var color;
@@ -0,0 +1,387 @@
+import json
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import date
+from itertools import islice
+
+
+def _date_key(value):
+    """Normalise a task's date (date object, ISO string or None) to ISO text."""
+    if value is None:
+        return None
+    if isinstance(value, date):
+        return value.isoformat()
+    return date.fromisoformat(value).isoformat()
+
+
+def _index_date(task):
+    """
+    Date a task is indexed under. Recurring tasks go under None with the
+    undated ones, so every range load returns them; the scheduler works
+    out which days they fall on.
+    """
+    if task.get("recurrence"):
+        return None
+    return _date_key(task.get("date"))
+
+
+def _with_id(task):
+    """Copy of task carrying an id, generating one if it has none."""
+    if task.get("id"):
+        return dict(task)
+    return {**task, "id": str(uuid.uuid4())}
+
+
+class TaskStore(ABC):
+    """
+    Storage interface for task dicts.
+
+    Tasks are keyed by "id" and indexed by "date". Recurring tasks, and
+    undated ones, are returned by every range query, since they float to
+    whatever days the scheduler puts them on. The app dates new tasks
+    when it stores them, so undated rows come from older databases or
+    from other callers.
+    """
+
+    @abstractmethod
+    def add_many(self, tasks):
+        """Store tasks in one batch; returns the stored copies (with ids)."""
+
+    def add(self, task):
+        return self.add_many([task])[0]
+
+    @abstractmethod
+    def get(self, task_id):
+        ...
+
+    @abstractmethod
+    def existing(self, task_ids):
+        """The subset of task_ids stored on this calendar, in one lookup."""
+
+    @abstractmethod
+    def update(self, task_id, **fields):
+        """Merge fields into a stored task; returns it, or None if missing."""
+
+    @abstractmethod
+    def remove(self, task_id):
+        ...
+
+    @abstractmethod
+    def load(self, start_date=None, end_date=None, offset=0, limit=None):
+        """
+        Tasks dated within [start_date, end_date] plus undated ones, in
+        insertion order; offset/limit page through that order.
+        """
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    @abstractmethod
+    def revision(self):
+        """
+        Counter that moves on every write to this calendar, from any
+        process, so a cached copy of its tasks can tell it is stale.
+        """
+
+    @contextmanager
+    def batch(self):
+        """Group several writes into one transaction where supported."""
+        yield self
+
+
+class MemoryTaskStore(TaskStore):
+    """
+    Process-local store; what the app used before SQLite, minus the scans.
+    batch() keeps an undo journal, so a batch that raises rolls back here
+    too.
+    """
+
+    def __init__(self):
+        self._tasks    = {}   # id -> task, in insertion order
+        self._order    = {}   # id -> insertion counter, to sort range hits
+        self._by_date  = {}   # ISO date (or None) -> set of ids
+        self._counter  = 0
+        self._revision = 0
+        self._journal  = None   # inside batch(): (id, old task, old order), oldest first
+        self._lock     = threading.Lock()
+
+    @contextmanager
+    def batch(self):
+        outer = self._journal is None
+        if outer:
+            self._journal = []
+            revision = self._revision
+        try:
+            yield self
+        except BaseException:
+            if outer:
+                self._rollback(revision)
+            raise
+        finally:
+            if outer:
+                self._journal = None
+
+    def _remember(self, task_id):
+        if self._journal is not None:
+            self._journal.append((task_id, self._tasks.get(task_id), self._order.get(task_id)))
+
+    def _rollback(self, revision):
+        with self._lock:
+            for task_id, task, order in reversed(self._journal):
+                self._tasks.pop(task_id, None)
+                self._order.pop(task_id, None)
+                if task is not None:
+                    self._tasks[task_id] = task
+                    self._order[task_id] = order
+            # restored rows went to the end; put everything back in order
+            self._tasks = dict(sorted(self._tasks.items(), key=lambda kv: self._order[kv[0]]))
+            self._by_date = {}
+            for task_id, t in self._tasks.items():
+                self._by_date.setdefault(_index_date(t), set()).add(task_id)
+            self._revision = revision
+
+    def add_many(self, tasks):
+        stored = [_with_id(t) for t in tasks]
+        with self._lock:
+            self._revision += 1
+            for t in stored:
+                self._remember(t["id"])
+                self._drop(t["id"])
+                self._counter += 1
+                self._tasks[t["id"]] = t
+                self._order[t["id"]] = self._counter
+                self._by_date.setdefault(_index_date(t), set()).add(t["id"])
+        return [dict(t) for t in stored]
+
+    def get(self, task_id):
+        t = self._tasks.get(task_id)
+        return dict(t) if t is not None else None
+
+    def existing(self, task_ids):
+        return {i for i in task_ids if i in self._tasks}
+
+    def update(self, task_id, **fields):
+        with self._lock:
+            t = self._tasks.get(task_id)
+            if t is None:
+                return None
+            self._remember(task_id)
+            self._by_date[_index_date(t)].discard(task_id)
+            t = {**t, **fields}
+            self._revision += 1
+            self._tasks[task_id] = t
+            self._by_date.setdefault(_index_date(t), set()).add(task_id)
+        return dict(t)
+
+    def remove(self, task_id):
+        with self._lock:
+            self._revision += 1
+            self._remember(task_id)
+            self._drop(task_id)
+
+    def _drop(self, task_id):
+        t = self._tasks.pop(task_id, None)
+        self._order.pop(task_id, None)
+        if t is not None:
+            self._by_date[_index_date(t)].discard(task_id)
+
+    def load(self, start_date=None, end_date=None, offset=0, limit=None):
+        stop = None if limit is None else offset + limit
+        if start_date is None and end_date is None:
+            return [dict(t) for t in islice(self._tasks.values(), offset, stop)]
+        lo = _date_key(start_date) or ""
+        hi = _date_key(end_date) or "9999-12-31"
+        ids = []
+        for d, members in list(self._by_date.items()):
+            if d is None or lo <= d <= hi:
+                ids.extend(members)
+        ids.sort(key=lambda i: self._order.get(i, 0))
+        return [dict(self._tasks[i]) for i in ids[offset:stop] if i in self._tasks]
+
+    def clear(self):
+        with self._lock:
+            self._revision += 1
+            for task_id in self._tasks:
+                self._remember(task_id)
+            self._tasks.clear()
+            self._order.clear()
+            self._by_date.clear()
+
+    def revision(self):
+        return self._revision
+
+
+class _Connection:
+    """A thread's connection to one database file, plus its batch nesting."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.depth = 0
+
+
+_connections = threading.local()   # per thread: path -> _Connection
+
+
+class SQLiteTaskStore(TaskStore):
+    """
+    Embedded SQLite store in WAL mode, so several worker processes can
+    share one database file. Each store is one calendar's slice of the
+    tasks table; stores on the same file share a connection per thread.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id       TEXT NOT NULL,
+            calendar TEXT NOT NULL DEFAULT 'default',
+            date     TEXT,
+            body     TEXT NOT NULL,
+            PRIMARY KEY (calendar, id)
+        );
+        CREATE TABLE IF NOT EXISTS revisions (
+            calendar TEXT PRIMARY KEY,
+            rev      INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_tasks_calendar_date ON tasks(calendar, date);
+    """
+
+    _initialised = set()   # paths whose schema this process has created
+    MAX_PARAMS   = 900     # ids per IN (...) query; older SQLite allows 999 parameters
+
+    def __init__(self, path, calendar="default"):
+        self.path     = path
+        self.calendar = calendar
+        if path in self._initialised:
+            return
+        self._conn().executescript(self.SCHEMA)
+        self._initialised.add(path)
+
+    def _handle(self):
+        handles = getattr(_connections, "handles", None)
+        if handles is None:
+            handles = _connections.handles = {}
+        handle = handles.get(self.path)
+        if handle is None:
+            handle = handles[self.path] = _Connection(self.path)
+        return handle
+
+    def _conn(self):
+        return self._handle().conn
+
+    @contextmanager
+    def batch(self):
+        handle = self._handle()
+        outer = handle.depth == 0
+        if outer:
+            handle.conn.execute("BEGIN IMMEDIATE")
+        handle.depth += 1
+        try:
+            yield self
+        except BaseException:
+            handle.depth -= 1
+            if outer:
+                handle.conn.execute("ROLLBACK")
+            raise
+        handle.depth -= 1
+        if outer:
+            handle.conn.execute("COMMIT")
+
+    def _bump(self):
+        # in the same transaction as the write it counts
+        self._conn().execute(
+            "INSERT INTO revisions (calendar, rev) VALUES (?, 1) "
+            "ON CONFLICT(calendar) DO UPDATE SET rev = rev + 1", (self.calendar,))
+
+    def revision(self):
+        row = self._conn().execute(
+            "SELECT rev FROM revisions WHERE calendar = ?", (self.calendar,)).fetchone()
+        return row[0] if row else 0
+
+    def add_many(self, tasks):
+        stored = [_with_id(t) for t in tasks]
+        with self.batch():
+            self._bump()
+            # re-adding an id replaces the row, which moves it to the end
+            self._conn().executemany(
+                "INSERT OR REPLACE INTO tasks (id, calendar, date, body) VALUES (?, ?, ?, ?)",
+                [(t["id"], self.calendar, _index_date(t), json.dumps(t, default=str))
+                 for t in stored]
+            )
+        return stored
+
+    def get(self, task_id):
+        row = self._conn().execute(
+            "SELECT body FROM tasks WHERE id = ? AND calendar = ?",
+            (task_id, self.calendar)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def existing(self, task_ids):
+        task_ids, found = list(task_ids), set()
+        # chunked to stay under SQLite's limit on bound parameters
+        for i in range(0, len(task_ids), self.MAX_PARAMS):
+            chunk = task_ids[i:i + self.MAX_PARAMS]
+            rows  = self._conn().execute(
+                "SELECT id FROM tasks WHERE calendar = ? AND id IN (%s)" % ",".join("?" * len(chunk)),
+                (self.calendar, *chunk))
+            found.update(task_id for (task_id,) in rows)
+        return found
+
+    def update(self, task_id, **fields):
+        with self.batch():
+            t = self.get(task_id)
+            if t is None:
+                return None
+            t.update(fields)
+            self._bump()
+            self._conn().execute(
+                "UPDATE tasks SET date = ?, body = ? WHERE id = ? AND calendar = ?",
+                (_index_date(t), json.dumps(t, default=str), task_id, self.calendar))
+        return t
+
+    def remove(self, task_id):
+        with self.batch():
+            self._bump()
+            self._conn().execute("DELETE FROM tasks WHERE id = ? AND calendar = ?",
+                                 (task_id, self.calendar))
+
+    def load(self, start_date=None, end_date=None, offset=0, limit=None):
+        page = (-1 if limit is None else limit, offset)   # LIMIT -1 means no limit
+        if start_date is None and end_date is None:
+            rows = self._conn().execute(
+                "SELECT body FROM tasks WHERE calendar = ? ORDER BY rowid LIMIT ? OFFSET ?",
+                (self.calendar, *page))
+        else:
+            rows = self._conn().execute(
+                "SELECT body FROM tasks WHERE calendar = ? "
+                "AND (date IS NULL OR date BETWEEN ? AND ?) ORDER BY rowid LIMIT ? OFFSET ?",
+                (self.calendar, _date_key(start_date) or "", _date_key(end_date) or "9999-12-31",
+                 *page))
+        return [json.loads(body) for (body,) in rows]
+
+    def clear(self):
+        with self.batch():
+            self._bump()
+            self._conn().execute("DELETE FROM tasks WHERE calendar = ?", (self.calendar,))
+
+
+def open_store(location, calendar="default"):
+    """
+    Build one calendar's store from a location string: "memory" (or
+    ":memory:") for a process-local store, anything else is a SQLite
+    database path shared by all calendars.
+    """
+    if location in ("memory", ":memory:"):
+        # the store is the only copy, so hand out the same one every time
+        with _memory_lock:
+            return _memory_stores.setdefault(calendar, MemoryTaskStore())
+    return SQLiteTaskStore(location, calendar)
+
+
+_memory_stores = {}
+_memory_lock   = threading.Lock()
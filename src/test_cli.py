@@ -0,0 +1,57 @@
+import os, sys
+sys.path.append(os.path.dirname(__file__))
+import io
+import json
+
+import cli
+
+
+def test_cli_schedules_files_and_stdin_on_a_pool(tmp_path, monkeypatch, capsys):
+    (tmp_path / "alice.ndjson").write_text("\n".join([
+        json.dumps({"id": "a1", "title": "Gym", "duration": 60, "date": "2025-07-01"}),
+        json.dumps({"id": "a2", "title": "Lunch", "duration": 60, "fixed": True,
+                    "start_time": "12:00", "date": "2025-07-01"}),
+        '{"title": "broken"}',
+    ]))
+    (tmp_path / "team.ics").write_text(
+        "BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\nUID:sync\r\nSUMMARY:Sync\r\n"
+        "DTSTART:20250701T100000\r\nDURATION:PT30M\r\nEND:VEVENT\r\nEND:VCALENDAR\r\n")
+    (tmp_path / "notes.txt").write_text("not a calendar")
+    stdin = json.dumps({"calendar": "bob", "tasks": [{"title": "Read", "duration": 30, "date": "2025-07-01"}]})
+
+    outputs = []
+    for workers in ("1", "2"):
+        monkeypatch.setattr(sys, "stdin", io.StringIO(stdin + "\n"))
+        assert cli.main([str(tmp_path), "-", "--date", "2025-07-01", "--workers", workers]) == 0
+        out, err = capsys.readouterr()
+        outputs.append([json.loads(line) for line in out.splitlines()])
+        assert "3 calendars (4 tasks)" in err and "calendars/s" in err
+
+    alice, team, bob = outputs[0]
+    assert [r["calendar"] for r in outputs[0]] == ["alice", "team", "bob"]
+    assert (alice["tasks"], alice["skipped"]) == (2, 1)
+    assert {b["title"]: b["start_time"] for b in alice["scheduled"]} == {"Gym": "09:00", "Lunch": "12:00"}
+    assert team["scheduled"][0]["start_time"] == "10:00" and bob["scheduled"][0]["title"] == "Read"
+    # the pool writes the same results, in the same order
+    strip = lambda rs: [{k: v for k, v in r.items() if k != "ms"} for r in rs]
+    assert strip(outputs[1]) == strip(outputs[0])
+
+
+def test_cli_reports_bad_calendars_and_keeps_going(tmp_path, monkeypatch, capsys):
+    good = tmp_path / "good.ndjson"
+    good.write_text(json.dumps({"id": "g", "title": "Gym", "duration": 60, "date": "2025-07-01"}))
+    stdin = "\n".join(["{not json", "[1, 2]",
+                       json.dumps({"calendar": "bob", "tasks": [{"title": "Read", "duration": 30}]})])
+
+    for workers in ("1", "2"):
+        monkeypatch.setattr(sys, "stdin", io.StringIO(stdin + "\n"))
+        code = cli.main([str(good), str(tmp_path / "missing.ndjson"), "-",
+                         "--date", "2025-07-01", "--workers", workers])
+        out, err = capsys.readouterr()
+        results = [json.loads(line) for line in out.splitlines()]
+        assert code == 1
+        assert [r["calendar"] for r in results] == ["good", "missing", "stdin-1", "stdin-2", "bob"]
+        assert [r["calendar"] for r in results if "error" in r] == ["missing", "stdin-1", "stdin-2"]
+        assert "No such file" in results[1]["error"] and "stdin line 1" in results[2]["error"]
+        assert results[0]["scheduled"][0]["title"] == "Gym" and results[4]["tasks"] == 1
+        assert "3 of 5 calendars failed" in err
@@ -0,0 +1,245 @@
+import os, sys
+sys.path.append(os.path.dirname(__file__))
+import asyncio
+from types import SimpleNamespace
+
+import llm
+
+
+class FakeCompletions:
+    def __init__(self, content):
+        self.content = content
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def test_request_actions_is_cached(monkeypatch):
+    completions = FakeCompletions('{"actions": [{"type": "remove_task", "task_id": "a"}]}')
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(llm, "get_client", lambda: client)
+    monkeypatch.setattr(llm, "cache", llm.ActionCache(max_size=2, ttl=60))
+
+    first = llm.request_actions("sys", "[]", "drop a")
+    first[0]["task_id"] = "mutated"
+    again = llm.request_actions("sys", "[]", "drop a")
+    assert again == [{"type": "remove_task", "task_id": "a"}]
+    assert completions.calls == 1
+
+    # different task state is a different question
+    llm.request_actions("sys", '[{"id": "a"}]', "drop a")
+    assert completions.calls == 2
+
+    stats = llm.cache.stats()
+    assert (stats["hits"], stats["misses"], stats["llm_calls"]) == (1, 2, 2)
+
+
+def test_cache_evicts_least_recent_and_expired(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(llm.time, "monotonic", lambda: now[0])
+    cache = llm.ActionCache(max_size=2, ttl=10)
+    cache.put("a", [1])
+    cache.put("b", [2])
+    assert cache.get("a") == [1]
+    cache.put("c", [3])            # evicts "b", the least recently used
+    assert cache.get("b") is None
+    now[0] = 11
+    assert cache.get("a") is None  # expired
+
+
+def test_stream_parser_yields_each_action_once_complete():
+    reply = ('{"actions": [{"type": "add_task", "task": {"title": "Say \\"hi\\" {now}", '
+             '"duration": 30}}, {"type": "remove_task", "task_id": "a"}]}')
+    parser = llm.ActionStreamParser()
+    seen = []
+    for i in range(0, len(reply), 7):
+        for action in parser.feed(reply[i:i + 7]):
+            seen.append((i, action["type"]))
+
+    assert [t for _, t in seen] == ["add_task", "remove_task"]
+    # the first action is released well before the stream ends
+    assert seen[0][0] < reply.index("remove_task")
+    assert parser.done
+    assert parser.actions[0]["task"]["title"] == 'Say "hi" {now}'
+
+
+class FakeStream:
+    """Stands in for the completions endpoint with stream=True."""
+
+    def __init__(self, reply, size=5):
+        self.chunks = [reply[i:i + size] for i in range(0, len(reply), size)]
+
+    def create(self, **kwargs):
+        assert kwargs["stream"] is True
+        for text in self.chunks:
+            delta = SimpleNamespace(content=text)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+def test_natural_schedule_stream_route(monkeypatch):
+    monkeypatch.setenv("CALENDAR_DB", "memory")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    import app as app_module
+    session = app_module.sessions.get("stream-test")
+    app_module.app.test_client().post("/reset-tasks", headers={"X-Calendar-Id": "stream-test"})
+
+    reply = ('{"actions": [{"type": "add_task", "title": "Write", "duration": 60}, '
+             '{"type": "add_rest", "duration": 15}]}')
+    client = SimpleNamespace(chat=SimpleNamespace(completions=FakeStream(reply)))
+    monkeypatch.setattr(llm, "get_client", lambda: client)
+    monkeypatch.setattr(llm, "cache", llm.ActionCache())
+
+    resp = app_module.app.test_client().post(
+        "/natural-schedule/stream", json={"prompt": "write for an hour then rest"},
+        headers={"X-Calendar-Id": "stream-test"})
+    assert resp.mimetype == "text/event-stream"
+    events = [block.split("\n")[0] for block in resp.get_data(as_text=True).split("\n\n") if block]
+    assert events == ["event: action", "event: action", "event: done"]
+    assert len(session.store.load()) == 2
+    assert len(session.scheduler.tasks) == 2
+
+
+class GatedCompletions:
+    """
+    Async completions endpoint that holds every call until `open_at` are
+    in flight at once. Calls past the first `answer` never get a reply,
+    so they run into llm.TIMEOUT.
+    """
+
+    def __init__(self, open_at, answer=None):
+        self.open_at, self.answer = open_at, answer
+        self.gate = asyncio.Event()
+        self.calls = self.inflight = self.peak = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        n = self.calls
+        self.inflight += 1
+        self.peak = max(self.peak, self.inflight)
+        if self.inflight >= self.open_at:
+            self.gate.set()
+        try:
+            await self.gate.wait()
+            if self.answer is not None and n > self.answer:
+                await asyncio.Event().wait()   # until the caller gives up
+        finally:
+            self.inflight -= 1
+        content = '{"actions": [{"type": "add_task", "title": "Call %d", "duration": 30}]}' % n
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def test_asgi_natural_schedule_overlaps_model_calls(monkeypatch):
+    import httpx
+
+    monkeypatch.setenv("CALENDAR_DB", "memory")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(llm, "cache", llm.ActionCache())
+    import asgi
+
+    async def run(n, **gate):
+        completions = GatedCompletions(**gate)
+        monkeypatch.setattr(llm, "_async_client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=None) as client:
+            resps = await asyncio.gather(*(
+                client.post("/natural-schedule", json={"prompt": f"gated task {i}"},
+                            headers={"X-Calendar-Id": f"gated-{i % 4}"}) for i in range(n)))
+        return sorted(r.status_code for r in resps), completions.peak
+
+    # answered only once all 40 are waiting on the model together; if the
+    # calls were serialized the gate would never open and they'd all time out
+    monkeypatch.setattr(llm, "TIMEOUT", 5)
+    statuses, peak = asyncio.run(run(40, open_at=40))
+    assert statuses == [200] * 40 and peak == 40
+
+    # two slots, and only the first two calls ever answer: the four queued
+    # behind them get a slot but not a reply
+    monkeypatch.setattr(llm, "MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(llm, "TIMEOUT", 1)
+    statuses, peak = asyncio.run(run(6, open_at=2, answer=2))
+    assert statuses == [200, 200, 504, 504, 504, 504]
+    assert peak == 2
+
+
+def test_asgi_natural_schedule_runs_flask_hooks_and_error_handlers(monkeypatch):
+    import httpx
+
+    monkeypatch.setenv("CALENDAR_DB", "memory")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(llm, "cache", llm.ActionCache())
+    import asgi
+    completions = GatedCompletions(open_at=1)
+    monkeypatch.setattr(llm, "_async_client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+
+    def boom(*args):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(asgi, "_natural_finish", boom)
+    monkeypatch.setattr(asgi.flask_app, "testing", False)
+
+    async def run():
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            resp = await client.post("/natural-schedule", json={"prompt": "hooked task"},
+                                     headers={"X-Calendar-Id": "hooked"})
+            return resp, (await client.get("/metrics")).text
+
+    resp, text = asyncio.run(run())
+    # the JSON 500 any route gets, and the timing hook saw the request
+    assert resp.status_code == 500 and resp.json() == {"error": "Internal server error"}
+    assert 'method="POST",route="/natural-schedule",status="500"' in text
+
+
+def test_task_context_is_windowed_and_budgeted():
+    from datetime import date, timedelta
+    from prompt_context import TaskContext, estimate_tokens, prompt_window
+
+    day0  = date(2025, 7, 1)
+    tasks = [{"id": f"task-{i}", "title": f"Task {i}", "duration": 30, "fixed": False,
+              "date": (day0 + timedelta(days=i % 30)).isoformat()} for i in range(300)]
+    tasks.append({"id": "standup", "title": "Standup", "duration": 15, "fixed": True,
+                  "start_time": "09:30", "date": "2025-06-02", "recurrence": {"freq": "weekdays"}})
+
+    window = prompt_window("clear my afternoon on 2025-07-03", today=day0)
+    assert window == (date(2025, 7, 3), date(2025, 7, 3))
+    context = TaskContext(tasks, window, budget=2000)
+    rows = context.text.split("\n")
+    assert context.listed == 11   # the series and the ten tasks on the 3rd
+    assert "t1|Standup|2025-06-02|09:30|15||weekdays" in rows
+    assert any(r.startswith("# before: 20 tasks") for r in rows)
+    assert any(r.startswith("# after: 270 tasks") for r in rows)
+    assert context.resolve({"type": "remove_task", "task_id": "t2"})["task_id"] == "task-2"
+
+    tight = TaskContext(tasks, window, budget=80)
+    assert estimate_tokens(tight.text) <= 80
+    assert tight.listed < 11 and "# unlisted:" in tight.text
+    assert context.full_tokens > 10 * context.tokens
+    # scaled up from a sample, but close to the real dump for uniform tasks
+    import json
+    exact = estimate_tokens(json.dumps(tasks))
+    assert abs(context.full_tokens - exact) < exact // 10
+
+
+def test_natural_schedule_resolves_context_aliases(monkeypatch):
+    monkeypatch.setenv("CALENDAR_DB", "memory")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    import app as app_module
+    headers = {"X-Calendar-Id": "context-test"}
+    http = app_module.app.test_client()
+    http.post("/reset-tasks", headers=headers)
+    for title in ("Keep", "Drop"):
+        http.post("/add-task", json={"title": title, "duration": 30}, headers=headers)
+
+    completions = FakeCompletions('{"actions": [{"type": "remove_task", "task_id": "t2"}]}')
+    sent = []
+    create = completions.create
+    completions.create = lambda **kw: sent.append(kw["messages"]) or create(**kw)
+    monkeypatch.setattr(llm, "get_client", lambda: SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    monkeypatch.setattr(llm, "cache", llm.ActionCache())
+
+    resp = http.post("/natural-schedule", json={"prompt": "drop the second one"}, headers=headers)
+    assert resp.status_code == 200
+    assert "|Drop|" in sent[0][1]["content"] and '"id"' not in sent[0][1]["content"]
+    assert [t["title"] for t in http.get("/get-tasks", headers=headers).get_json()["tasks"]] == ["Keep"]
@@ -30,3 +30,221 @@ def test_move_and_remove():
     sched.remove_task("exam")
     schedule = sched.schedule()
     assert extract(schedule, "Chores")["start_time"] == "12:00"
+
+
+def test_interval_index_matches_linear_scan():
+    import random
+    from intervals import IntervalIndex
+
+    def linear_gap(blocks, dur, earliest, latest):
+        candidate = earliest
+        for st, en in sorted(blocks):
+            if candidate + dur <= st and candidate + dur <= latest:
+                return candidate
+            candidate = max(candidate, en)
+            if candidate > latest:
+                break
+        return candidate if candidate + dur <= latest else None
+
+    rng = random.Random(7)
+    index, blocks = IntervalIndex(), []
+    for _ in range(400):
+        if blocks and rng.random() < 0.3:
+            st, en, rec = blocks.pop(rng.randrange(len(blocks)))
+            index.remove(st, en, rec)
+        else:
+            st = rng.randrange(0, 1400)
+            block = (st, st + rng.randrange(0, 120), object())
+            blocks.append(block)
+            index.add(*block)
+        dur = rng.randrange(0, 180)
+        earliest = rng.randrange(0, 1200)
+        latest = earliest + rng.randrange(0, 600)
+        expected = linear_gap([b[:2] for b in blocks], dur, earliest, latest)
+        assert index.find_gap(dur, earliest, latest) == expected
+
+
+def test_schedule_only_resolves_changed_days():
+    sched = Scheduler(base_time=datetime(2025, 7, 1, 9, 0))
+    for day in (1, 2, 3):
+        sched.add_task({"id": f"a{day}", "title": f"A{day}", "duration": 60,
+                        "date": datetime(2025, 7, day).date()})
+        sched.add_task({"id": f"b{day}", "title": f"B{day}", "duration": 30,
+                        "date": datetime(2025, 7, day).date()})
+
+    first = sched.schedule()
+    assert len(sched.solved_days) == 3
+
+    assert sched.schedule() == first
+    assert sched.solved_days == []
+
+    sched.move_task("a2", earliest_time="13:00")
+    schedule = sched.schedule()
+    assert sched.solved_days == [datetime(2025, 7, 2).date()]
+    assert next(i for i in schedule if i["id"] == "a2")["start_time"] == "13:00"
+
+    sched.remove_task("b3")
+    sched.schedule()
+    assert sched.solved_days == [datetime(2025, 7, 3).date()]
+
+
+def test_parallel_schedule_matches_serial():
+    def build():
+        sched = Scheduler(base_time=datetime(2025, 7, 1, 9, 0))
+        for day in range(1, 8):
+            d = datetime(2025, 7, day).date()
+            sched.add_task({"id": f"m{day}", "title": "Meeting", "duration": 60,
+                            "fixed": True, "start_time": "10:00", "date": d})
+            sched.add_task({"id": f"w{day}", "title": "Work", "duration": 120,
+                            "priority": "high", "date": d})
+            sched.add_task({"id": f"e{day}", "title": "Email", "duration": 30,
+                            "priority": "low", "date": d})
+        return sched
+
+    assert build().schedule(parallel=True, max_workers=2) == build().schedule()
+
+
+def test_overloaded_day_reports_unscheduled():
+    sched = Scheduler(base_time=datetime(2025, 7, 1, 9, 0))
+    sched.add_task({"id": "deep", "title": "Deep work", "duration": 120,
+                    "priority": "high", "latest_time": "13:00"})
+    sched.add_task({"id": "call", "title": "Call", "duration": 60,
+                    "priority": "low", "latest_time": "12:00"})
+    sched.add_task({"id": "gym", "title": "Gym", "duration": 60,
+                    "priority": "medium", "earliest_time": "18:00"})
+
+    schedule = sched.schedule()
+    # the call ends exactly at its latest_time, right after deep work
+    assert [(i["id"], i["start_time"]) for i in schedule] == [("deep", "09:00"), ("call", "11:00"), ("gym", "18:00")]
+    assert sched.unscheduled == []
+
+    sched.add_task({"id": "late", "title": "Late", "duration": 30,
+                    "priority": "low", "latest_time": "12:00"})
+    sched.schedule()
+    assert [t["id"] for t in sched.unscheduled] == ["late"]
+    assert sched.unscheduled[0]["date"] == "2025-07-01"
+
+
+def test_profile_records_phases_and_probes():
+    from scheduler import SolveStats
+
+    sched = Scheduler(base_time=datetime(2025, 7, 1, 9, 0))
+    sched.add_task({"id": "exam", "title": "Exam", "duration": 60, "fixed": True, "start_time": "12:00"})
+    sched.add_task({"id": "read", "title": "Read", "duration": 30})
+    sched.add_task({"id": "walk", "title": "Walk", "duration": 45, "priority": "low"})
+    plain = sched.schedule()
+
+    sched.profile = SolveStats()
+    sched.move_task("read", earliest_time="13:00")
+    sched.schedule()
+    report = sched.profile.as_dict(sched.solved_days)
+    assert report["gap_probes"] == 2
+    assert report["days"] == [{"date": "2025-07-01", "gap_probes": 2, "evictions": 0}]
+    assert {"fixed", "flex_sort", "find_gap", "final_sort"} <= set(report["phases_ms"])
+    assert len(plain) == 3
+
+
+def test_recurring_tasks_expand_only_over_the_window():
+    from datetime import date, timedelta
+    from recurrence import Recurrence
+
+    # 2025-07-01 is a Tuesday
+    sched = Scheduler(base_time=datetime(2025, 7, 1, 9, 0))
+    sched.add_task({"id": "standup", "title": "Standup", "duration": 15, "fixed": True,
+                    "start_time": "09:30", "date": "2025-07-01",
+                    "recurrence": {"freq": "weekdays", "exceptions": ["2025-07-04"]}})
+    sched.add_task({"id": "focus", "title": "Focus", "duration": 60, "date": "2025-07-02"})
+    assert len(sched.tasks) == 1 and len(sched.series) == 1
+
+    week = sched.schedule(window=(date(2025, 6, 30), date(2025, 7, 6)))
+    standups = [b for b in week if b.get("series_id") == "standup"]
+    assert [b["date"] for b in standups] == ["2025-07-01", "2025-07-02", "2025-07-03"]
+    assert standups[0]["id"] == "standup@2025-07-01" and "recurrence" not in standups[0]
+    # the one-off task works around that day's occurrence
+    assert extract(week, "Focus")["start_time"] == "09:45"
+
+    far = sched.schedule(window=(date(2030, 1, 1), date(2030, 1, 7)))
+    assert len(far) == 5 and not sched.unscheduled
+
+    # without a window the series stays anchored where the scheduler started,
+    # even though each call leaves base_time on its last solved day
+    plain = sched.copy()
+    runs  = [[b["date"] for b in plain.schedule() if b.get("series_id")] for _ in range(3)]
+    assert runs[0] == runs[1] == runs[2]
+    assert runs[0][0] == "2025-07-01" and runs[0][-1] == "2025-07-28"
+
+    # re-anchoring a copy (as a long-lived session does each day) moves the horizon too
+    later = sched.copy()
+    later.anchor(datetime(2025, 9, 1, 9, 0))
+    dates = [b["date"] for b in later.schedule() if b.get("series_id")]
+    assert dates[0] == "2025-09-01" and dates[-1] == "2025-09-26"
+
+    rule = Recurrence({"freq": "weekly", "byweekday": ["tue", "thu"], "interval": 2, "count": 5},
+                       date(2025, 7, 3))
+    days  = list(rule.between(date(2025, 6, 1), date(2025, 9, 1)))
+    brute = [d for d in (date(2025, 6, 1) + timedelta(n) for n in range(93)) if rule.occurs_on(d)]
+    assert days == brute == [date(2025, 7, 3), date(2025, 7, 15), date(2025, 7, 17),
+                             date(2025, 7, 29), date(2025, 7, 31)]
+
+
+def test_optimal_engine_beats_greedy_within_budget():
+    sched = Scheduler(base_time=datetime(2025, 7, 1, 9, 0))
+    sched.add_task({"id": "wall", "title": "Wall", "duration": 779, "fixed": True, "start_time": "11:00"})
+    sched.add_task({"id": "a", "title": "A", "duration": 60, "priority": "high"})
+    # only fits at 09:00, which greedy has already given to A
+    sched.add_task({"id": "b", "title": "B", "duration": 60, "earliest_time": "09:00", "latest_time": "10:00"})
+
+    greedy = sched.schedule()
+    assert [t["id"] for t in sched.unscheduled] == ["b"]
+
+    best = sched.schedule(engine="optimal", time_budget=0.5)
+    assert [(t["id"], t["start_time"]) for t in best] == [("b", "09:00"), ("a", "10:00"), ("wall", "11:00")]
+    report = sched.optimizer_report
+    assert (report["greedy_placed"], report["placed"]) == (len(greedy), 3)
+    assert report["objective"] > report["greedy_objective"] and report["proven_optimal"]
+
+    # a hopelessly overloaded day still comes back inside its budget
+    for i in range(200):
+        sched.add_task({"id": f"x{i}", "title": "X", "duration": 15 + i % 4 * 15,
+                        "priority": ("high", "medium", "low")[i % 3]})
+    sched.schedule(engine="optimal", time_budget=0.05)
+    report = sched.optimizer_report
+    assert report["objective"] >= report["greedy_objective"]
+    # the budget bounds the search (greedy and rendering come on top); it
+    # stops before a decode that would overrun, so only slack for one is allowed
+    assert 0 < report["search_ms"] <= report["budget_ms"] * 1.2
+    assert report["elapsed_ms"] >= report["search_ms"]
+
+    # a different budget is searched again rather than served from the cache
+    sched.schedule(engine="optimal", time_budget=0.2)
+    assert len(sched.solved_days) == 1 and sched.optimizer_report["budget_ms"] == 200
+    sched.schedule(engine="optimal", time_budget=0.2)
+    assert sched.solved_days == []
+
+
+def test_spillover_moves_overflow_to_later_gaps():
+    from datetime import date
+
+    sched = Scheduler(base_time=datetime(2025, 7, 1, 9, 0))
+    # 09:00-23:59 on the 1st is all but full; the 2nd has one morning meeting
+    sched.add_task({"id": "full", "title": "Full", "duration": 840, "date": "2025-07-01",
+                    "fixed": True, "start_time": "09:00"})
+    sched.add_task({"id": "meet", "title": "Meet", "duration": 60, "date": "2025-07-02",
+                    "fixed": True, "start_time": "09:00"})
+    sched.add_task({"id": "report", "title": "Report", "duration": 90, "date": "2025-07-01",
+                    "priority": "high", "earliest_time": "09:00"})
+    sched.add_task({"id": "late", "title": "Late", "duration": 60, "date": "2025-07-01",
+                    "deadline": "2025-07-01"})
+
+    sched.schedule()
+    assert {t["id"] for t in sched.unscheduled} == {"report", "late"}
+
+    out = sched.schedule(spillover=True)
+    report = extract(out, "Report")
+    assert (report["date"], report["start_time"], report["spilled_from"]) == ("2025-07-02", "10:00", "2025-07-01")
+    # a deadline of its own day leaves nowhere to go
+    assert [t["id"] for t in sched.unscheduled] == ["late"]
+
+    # nor does a window that ends on the overloaded day
+    sched.schedule(window=(None, date(2025, 7, 1)), spillover=True)
+    assert {t["id"] for t in sched.unscheduled} == {"report", "late"}
@@ -0,0 +1,235 @@
+import os, sys
+sys.path.append(os.path.dirname(__file__))
+from sessions import SessionCache
+from storage import MemoryTaskStore
+
+
+def test_session_cache_reuses_schedule_and_evicts():
+    stores = {}
+    cache = SessionCache(lambda cid: stores.setdefault(cid, MemoryTaskStore()), max_sessions=2)
+
+    a = cache.get("a")
+    with a.writing():
+        a.store.add({"id": "t1", "title": "T1", "duration": 30})
+        a.edit(lambda s: s.add_task(a.store.get("t1")))
+    first = a.schedule()
+    assert a.schedule()[0] is first[0]                                  # cached until the next edit
+
+    fork = a.fork()
+    fork.remove_task("t1")
+    assert [t["id"] for t in a.schedule()[0]] == ["t1"]                 # forks don't leak back
+
+    cache.get("b"), cache.get("c")
+    assert cache.stats()["evictions"] == 1
+    rebuilt = cache.get("a")
+    assert rebuilt is not a and [t["id"] for t in rebuilt.scheduler.tasks] == ["t1"]
+
+
+def test_sessions_pick_up_writes_from_other_processes(tmp_path):
+    from storage import SQLiteTaskStore
+
+    # two caches on one database file stand in for two worker processes
+    path = str(tmp_path / "shared.db")
+    one, two = (SessionCache(lambda cid: SQLiteTaskStore(path, cid)) for _ in range(2))
+    a, b = one.get("team"), two.get("team")
+    etag = b.etag()
+
+    def add(session, task_id):
+        with session.writing():
+            stored = session.store.add({"id": task_id, "title": task_id, "duration": 30})
+            session.edit(lambda s: s.add_task(stored))
+
+    add(a, "t1")
+    assert two.get("team") is b
+    assert [t["id"] for t in b.schedule()[0]] == ["t1"] and b.etag() != etag
+
+    # a session's own writes don't make it reload
+    add(b, "t2")
+    version = b.version
+    assert two.get("team").version == version
+
+    # a stale session catches up before editing, so nothing is lost
+    add(a, "t3")
+    with b.writing():
+        b.edit(lambda s: s.remove_task("t2"))
+        b.store.remove("t2")
+    assert [t["id"] for t in b.scheduler.tasks] == ["t1", "t3"]
+    assert [t["id"] for t in one.get("team").scheduler.tasks] == ["t1", "t3"]
+
+
+def test_edits_publish_copies_and_readers_see_whole_versions():
+    import threading
+    from sessions import CalendarSession
+
+    session = CalendarSession("cow", MemoryTaskStore())
+    task = {"id": "t0", "title": "T0", "duration": 30}
+    session.edit(lambda s: s.add_task(task))
+    version, before = session.state
+    session.edit(lambda s: s.move_task("t0", earliest_time="13:00"))
+    assert session.version == version + 1
+    assert "earliest_time" not in before.tasks[0] and "date" not in task   # nothing changed in place
+    assert session.scheduler.tasks[0]["earliest_time"] == "13:00"
+
+    with session.writing():                                # a batch is one version
+        session.edit(lambda s: s.add_task({"id": "t1", "title": "T1", "duration": 30}))
+        session.edit(lambda s: s.remove_task("t1"))
+    assert session.version == version + 2
+
+    # readers never wait for the writer, and each sees some complete version
+    seen, done = [], threading.Event()
+
+    def read():
+        while not done.is_set():
+            version, scheduler = session.state
+            session.schedule()
+            seen.append((version, len(scheduler.tasks)))
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for r in readers:
+        r.start()
+    for i in range(2, 40):
+        session.edit(lambda s, i=i: s.add_task({"id": f"t{i}", "title": f"T{i}", "duration": 5}))
+    done.set()
+    for r in readers:
+        r.join()
+    assert seen and all(n == v - 2 for v, n in seen)
+    assert len(session.schedule()[0]) == 39
+
+
+def test_precomputer_coalesces_edits_and_serves_the_next_read():
+    from sessions import CalendarSession, Precomputer
+
+    pre = Precomputer(delay=0.05)
+    session = CalendarSession("pre", MemoryTaskStore(), pre)
+    session.edit(lambda s: s.add_task({"id": "t0", "title": "T0", "duration": 30}))
+    assert pre.wait_idle(5) and pre.stats()["runs"] == 0      # never read: nothing to precompute
+
+    session.schedule()
+    for i in range(1, 20):
+        session.edit(lambda s, i=i: s.add_task({"id": f"t{i}", "title": f"T{i}", "duration": 5}))
+    assert pre.wait_idle(5)
+    stats = pre.stats()
+    # one run unless the edit loop stalled past the delay
+    assert stats["runs"] <= 2 and stats["runs"] + stats["coalesced"] == 19
+
+    def solve(*args):
+        raise AssertionError("read should have been precomputed")
+    session._solve = solve
+    assert len(session.schedule()[0]) == 20
+
+
+def test_evicted_sessions_are_not_precomputed():
+    from sessions import SessionCache
+
+    cache = SessionCache(lambda cid: MemoryTaskStore(), max_sessions=1, precompute=True)
+    cache.precomputer.delay = 5
+    old = cache.get("old")
+    old.schedule()
+    old.edit(lambda s: s.add_task({"id": "t", "title": "T", "duration": 30}))
+    assert cache.precomputer.stats()["pending"] == 1
+
+    cache.get("new")                      # evicts "old" while it waits out the delay
+    assert old.evicted and cache.precomputer.wait_idle(2)
+    old.edit(lambda s: s.add_task({"id": "u", "title": "U", "duration": 30}))
+    stats = cache.stats()
+    assert (stats["precompute_runs"], stats["precompute_dropped"], stats["precompute_pending"]) == (0, 1, 0)
+
+
+def test_routes_are_scoped_by_calendar(monkeypatch):
+    monkeypatch.setenv("CALENDAR_DB", "memory")
+    import app as app_module
+    client = app_module.app.test_client()
+    for cid in ("alice", "bob"):
+        client.post("/reset-tasks", headers={"X-Calendar-Id": cid})
+
+    client.post("/add-task", json={"title": "Gym", "duration": 60}, headers={"X-Calendar-Id": "alice"})
+    alice = client.post("/schedule", json={}, headers={"X-Calendar-Id": "alice"}).get_json()
+    bob   = client.post("/schedule?calendar=bob", json={}).get_json()
+    assert [t["title"] for t in alice["scheduled"]] == ["Gym"]
+    assert bob["scheduled"] == []
+
+
+def test_schedule_delta_and_task_etags(monkeypatch):
+    monkeypatch.setenv("CALENDAR_DB", "memory")
+    import app as app_module
+    client  = app_module.app.test_client()
+    headers = {"X-Calendar-Id": "delta"}
+    client.post("/reset-tasks", headers=headers)
+    for title in ("A", "B"):
+        client.post("/add-task", json={"title": title, "duration": 30}, headers=headers)
+
+    first = client.post("/schedule", json={}, headers=headers).get_json()
+    client.post("/add-task", json={"title": "C", "duration": 30, "priority": "high"},
+                headers=headers)
+    second = client.post("/schedule", json={"since": first["version"]}, headers=headers).get_json()
+    assert "scheduled" not in second
+    assert [b["title"] for b in second["delta"]["added"]] == ["C"]
+    assert sorted(b["title"] for b in second["delta"]["moved"]) == ["A", "B"]   # pushed back by C
+    assert second["delta"]["removed"] == []
+    stale = client.post("/schedule", json={"since": "gone.1"}, headers=headers).get_json()
+    assert len(stale["scheduled"]) == 3
+
+    page = client.get("/get-tasks?limit=2", headers=headers)
+    assert [t["title"] for t in page.get_json()["tasks"]] == ["A", "B"]
+    assert page.get_json()["next_offset"] == 2
+    again = client.get("/get-tasks?limit=2", headers={**headers, "If-None-Match": page.headers["ETag"]})
+    assert again.status_code == 304
+    client.post("/reset-tasks", headers=headers)
+    assert client.get("/get-tasks?limit=2", headers={
+        **headers, "If-None-Match": page.headers["ETag"]}).status_code == 200
+
+
+def test_bad_tasks_are_rejected_and_bad_rows_skipped(monkeypatch, caplog):
+    monkeypatch.setenv("CALENDAR_DB", "memory")
+    import app as app_module
+    client  = app_module.app.test_client()
+    headers = {"X-Calendar-Id": "validate"}
+    client.post("/reset-tasks", headers=headers)
+
+    resp = client.post("/add-task", json={"title": "Exam", "duration": 60, "fixed": True}, headers=headers)
+    assert resp.status_code == 400
+    assert client.get("/get-tasks", headers=headers).get_json()["tasks"] == []
+
+    # rows stored before validation existed don't make the calendar unloadable
+    store = MemoryTaskStore()
+    store.add({"id": "ok", "title": "OK", "duration": 30})
+    store.add({"id": "bad", "title": "Bad", "duration": 30, "fixed": True})
+    cache = SessionCache(lambda cid: store)
+    session = cache.get("legacy")
+    assert [t["id"] for t in session.schedule()[0]] == ["ok"]
+    assert [i for i, _ in session.skipped] == ["bad"]
+    assert "skipped 1 unusable task" in caplog.text and cache.stats()["skipped_tasks"] == 1
+    assert "calendar_sessions_skipped_tasks" in client.get("/metrics").get_data(as_text=True)
+
+
+def test_failed_batches_are_not_published(monkeypatch):
+    monkeypatch.setenv("CALENDAR_DB", "memory")
+    import app as app_module
+    from sessions import CalendarSession
+    session = CalendarSession("rollback", MemoryTaskStore())
+    try:
+        with session.writing():
+            session.edit(lambda s: s.add_task({"id": "t1", "title": "T1", "duration": 30}))
+            raise RuntimeError("store rolled back")
+    except RuntimeError:
+        pass
+    assert session.version == 0 and session.scheduler.tasks == []
+
+    # a malformed action is a 400, and none of the request's actions stick
+    client  = app_module.app.test_client()
+    headers = {"X-Calendar-Id": "malformed"}
+    client.post("/reset-tasks", headers=headers)
+    client.post("/add-task", headers=headers, json={"title": "Keep", "duration": 30})
+    version = app_module.sessions.get("malformed").version
+    resp = client.post("/ai-schedule", headers=headers, json={"actions": [
+        {"type": "add_task", "title": "Write", "duration": 30},
+        {"type": "remove_task", "task_id": "nope"}, {"type": "move_task"}]})
+    assert resp.status_code == 400 and "task_id" in resp.get_json()["error"]
+    stored = client.get("/get-tasks", headers=headers).get_json()["tasks"]
+    live   = app_module.sessions.get("malformed")
+    assert [t["title"] for t in stored] == [t["title"] for t in live.scheduler.tasks] == ["Keep"]
+    assert live.version == version
+
+    # goals on /schedule are checked the same way
+    resp = client.post("/schedule", headers=headers, json={"goal": {"title": "Read"}})
+    assert resp.status_code == 400 and "total_minutes" in resp.get_json()["error"]
@@ -0,0 +1,84 @@
+import os, sys
+sys.path.append(os.path.dirname(__file__))
+import pytest
+from storage import MemoryTaskStore, SQLiteTaskStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryTaskStore()
+    return SQLiteTaskStore(str(tmp_path / "tasks.db"))
+
+
+def test_range_load_and_updates(store):
+    with store.batch():
+        a = store.add({"title": "A", "duration": 30, "date": "2025-07-01"})
+        store.add_many([
+            {"id": "b", "title": "B", "duration": 60, "date": "2025-07-03"},
+            {"id": "c", "title": "C", "duration": 45},
+        ])
+    assert a["id"]
+
+    titles = lambda ts: [t["title"] for t in ts]
+    assert titles(store.load()) == ["A", "B", "C"]
+    assert titles(store.load("2025-07-02", "2025-07-05")) == ["B", "C"]
+    assert titles(store.load(offset=1, limit=1)) == ["B"]
+    assert titles(store.load("2025-07-01", "2025-07-05", offset=1)) == ["B", "C"]
+
+    store.update("b", date="2025-07-01", earliest_time="10:00")
+    assert titles(store.load("2025-07-01", "2025-07-01")) == ["A", "B", "C"]
+    assert store.get("b")["earliest_time"] == "10:00"
+
+    assert store.existing(["b", "c", "nope"]) == {"b", "c"}
+
+    store.remove(a["id"])
+    assert store.get(a["id"]) is None
+    assert titles(store.load()) == ["B", "C"]
+
+    # recurring tasks come back for any range after their first date
+    store.add({"id": "r", "title": "R", "date": "2025-01-01", "recurrence": {"freq": "daily"}})
+    assert titles(store.load("2025-07-10", "2025-07-10")) == ["C", "R"]
+
+    # a batch that raises leaves nothing behind, on either backend
+    revision = store.revision()
+    with pytest.raises(RuntimeError):
+        with store.batch():
+            store.remove("b")
+            store.update("c", date="2025-07-20")
+            store.add({"id": "d", "title": "D", "duration": 5})
+            store.clear()
+            raise RuntimeError
+    assert titles(store.load()) == ["B", "C", "R"] and store.revision() == revision
+    assert titles(store.load("2025-07-10", "2025-07-10")) == ["C", "R"]
+
+    store.clear()
+    assert store.load() == []
+
+
+def test_sqlite_calendars_are_isolated(tmp_path):
+    path = str(tmp_path / "tasks.db")
+    alice, bob = SQLiteTaskStore(path, "alice"), SQLiteTaskStore(path, "bob")
+    alice.add({"id": "a", "title": "A", "date": "2025-07-01"})
+    bob.add({"id": "b", "title": "B", "date": "2025-07-01"})
+
+    assert [t["id"] for t in alice.load()] == ["a"]
+    assert [t["id"] for t in bob.load("2025-07-01", "2025-07-01")] == ["b"]
+    bob.remove("a")
+    bob.clear()
+    assert [t["id"] for t in alice.load()] == ["a"]
+
+    # ids are per calendar: the same id in bob doesn't touch alice's row
+    bob.add({"id": "a", "title": "Bob's A"})
+    bob.update("a", title="Bob's A, renamed")
+    assert alice.get("a")["title"] == "A" and bob.get("a")["title"] == "Bob's A, renamed"
+    bob.remove("a")
+    assert alice.get("a") is not None
+
+
+
+def test_existing_looks_ids_up_in_chunks(tmp_path):
+    store = SQLiteTaskStore(str(tmp_path / "tasks.db"))
+    store.add_many([{"id": f"t{i}", "title": "T", "duration": 5} for i in range(0, 2000, 2)])
+    found = store.existing(f"t{i}" for i in range(2000))
+    assert found == {f"t{i}" for i in range(0, 2000, 2)}
@@ -0,0 +1,103 @@
+import os, sys
+sys.path.append(os.path.dirname(__file__))
+import io
+import json
+
+import transfer
+
+CALENDAR = """BEGIN:VCALENDAR\r
+VERSION:2.0\r
+BEGIN:VEVENT\r
+UID:standup@example.com\r
+SUMMARY:Stand-up\\, daily\r
+DTSTART;TZID=Europe/Berlin:20250701T093000\r
+DTEND;TZID=Europe/Berlin:20250701T094500\r
+RRULE:FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR;UNTIL=20250731\r
+EXDATE;VALUE=DATE:20250704\r
+BEGIN:VALARM\r
+TRIGGER:-PT5M\r
+END:VALARM\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+UID:holiday\r
+SUMMARY:Holiday\r
+DTSTART;VALUE=DATE:20250704\r
+END:VEVENT\r
+BEGIN:VTODO\r
+UID:report\r
+SUMMARY:Write the quarterly report with a title long enough that it is folded \r
+ onto a second line\r
+DTSTART;VALUE=DATE:20250702\r
+DURATION:PT1H30M\r
+PRIORITY:1\r
+END:VTODO\r
+END:VCALENDAR\r
+"""
+
+
+def test_parse_ics_streams_events_and_todos():
+    parsed = list(transfer.parse_ics(io.BytesIO(CALENDAR.encode())))
+    (_, standup, _), (line, holiday, error), (_, report, _) = parsed
+    assert standup == {
+        "title": "Stand-up, daily", "id": "standup@example.com", "fixed": True,
+        "date": "2025-07-01", "start_time": "09:30", "duration": 15,
+        "recurrence": {"freq": "weekly", "until": "2025-07-31",
+                       "byweekday": ["mon", "tue", "wed", "thu", "fri"], "exceptions": ["2025-07-04"]}}
+    assert holiday is None and line == 14 and "all-day" in error
+    assert report["title"].endswith("folded onto a second line")
+    assert (report["fixed"], report["date"], report["duration"], report["priority"]) == \
+        (False, "2025-07-02", 90, "high")
+    assert all(transfer.task_error(t) is None for t in (standup, report))
+
+    # and back: folded lines stay within 75 octets and parse to the same tasks
+    exported = "".join(transfer.to_ics([standup, report], tasks=True))
+    assert max(len(l.encode()) for l in exported.split("\r\n")) <= 75
+    again = [t for _, t, _ in transfer.parse_ics(exported.splitlines(keepends=True))]
+    assert again[0] == standup and again[1] == report
+
+
+def test_import_and_export_routes(monkeypatch):
+    monkeypatch.setenv("CALENDAR_DB", "memory")
+    import app as app_module
+    monkeypatch.setattr(app_module, "IMPORT_BATCH_SIZE", 3)
+    client  = app_module.app.test_client()
+    headers = {"X-Calendar-Id": "transfer-test"}
+    client.post("/reset-tasks", headers=headers)
+
+    lines = [json.dumps({"id": f"t{i}", "title": f"Task {i}", "duration": 30, "date": "2025-07-01"})
+             for i in range(8)]
+    lines[2] = '{"title": "No duration"}'
+    lines[5] = "not json"
+    lines.append(lines[0])                      # duplicate id
+    resp = client.post("/import", data="\n".join(lines), content_type="application/x-ndjson",
+                       headers=headers).get_json()
+    assert resp["imported"] == 6 and resp["skipped"] == 3
+    assert [e["line"] for e in resp["errors"]] == [3, 6, 9]
+
+    resp = client.post("/import", headers=headers, data={
+        "file": (io.BytesIO(CALENDAR.encode()), "team.ics")}, content_type="multipart/form-data")
+    assert resp.get_json()["imported"] == 2
+
+    export = client.get("/export?start=2025-07-01&end=2025-07-01", headers=headers)
+    blocks = [json.loads(l) for l in export.get_data(as_text=True).splitlines()]
+    assert export.mimetype == "application/x-ndjson"
+    assert {b["title"] for b in blocks} == {f"Task {i}" for i in (0, 1, 3, 4, 6, 7)} | {"Stand-up, daily"}
+
+    ics = client.get("/export?format=ics&what=tasks", headers=headers).get_data(as_text=True)
+    assert ics.count("BEGIN:VEVENT") == 1 and ics.count("BEGIN:VTODO") == 7
+
+
+def test_same_ics_imports_into_several_sqlite_calendars(tmp_path, monkeypatch):
+    monkeypatch.setenv("CALENDAR_DB", "memory")
+    import app as app_module
+    from sessions import SessionCache
+    from storage import open_store
+    path = str(tmp_path / "tasks.db")
+    monkeypatch.setattr(app_module, "sessions", SessionCache(lambda cid: open_store(path, cid)))
+    client = app_module.app.test_client()
+
+    for cid in ("team-a", "team-b", "team-a"):
+        client.post("/import", data=CALENDAR, content_type="text/calendar",
+                    headers={"X-Calendar-Id": cid})
+    counts = {cid: len(open_store(path, cid).load()) for cid in ("team-a", "team-b")}
+    assert counts == {"team-a": 2, "team-b": 2}
@@ -0,0 +1,334 @@
+"""
+Bulk task import and export as NDJSON (one JSON object per line) or
+iCalendar (RFC 5545).
+
+Everything here works on iterators: the parsers take an upload's lines
+as they arrive and yield one task at a time, and the writers yield text
+as they go, so neither side ever holds a whole file.
+"""
+import json
+import re
+from datetime import date, datetime, timedelta, timezone
+from itertools import islice
+
+from recurrence import WEEKDAYS, Recurrence
+from scheduler import PRIORITY_CODES, parse_hhmm
+
+# fields a task keeps on import; the rest (end_time, series_id, ...) only
+# ever describe a rendered schedule
+TASK_FIELDS = ("id", "title", "duration", "priority", "fixed", "start_time",
+               "earliest_time", "latest_time", "date", "recurrence", "deadline")
+
+ICS_DAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+
+# iCalendar PRIORITY is 1 (highest) to 9 (lowest), 0 for undefined
+ICS_PRIORITY = {"high": 1, "medium": 5, "low": 9}
+
+_DURATION_RE = re.compile(
+    r"^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+
+
+def batches(items, size):
+    """Lists of up to `size` consecutive items."""
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def chunked(pieces, size=256):
+    """Join a generator's small pieces of text so a response sends fewer, larger chunks."""
+    for batch in batches(pieces, size):
+        yield "".join(batch)
+
+
+def task_error(task):
+    """Why `task` can't be stored, or None if it is fine."""
+    title = task.get("title")
+    if not isinstance(title, str) or not title.strip():
+        return "missing title"
+    duration = task.get("duration")
+    if isinstance(duration, bool) or not isinstance(duration, int) or not 0 < duration <= 1440:
+        return "duration must be whole minutes between 1 and 1440"
+    if task.get("priority", "medium") not in PRIORITY_CODES:
+        return f"unknown priority {task['priority']!r}"
+    if task.get("fixed") and "start_time" not in task:
+        return "fixed task without start_time"
+    try:
+        for field in ("start_time", "earliest_time", "latest_time"):
+            if task.get(field) is not None:
+                parse_hhmm(task[field])
+        for field in ("date", "deadline"):
+            if task.get(field) is not None:
+                date.fromisoformat(task[field])
+        if task.get("recurrence"):
+            Recurrence(task["recurrence"], date.fromisoformat(task.get("date") or date.today().isoformat()))
+    except (ValueError, TypeError, AttributeError) as e:
+        return str(e)
+    return None
+
+
+# --- NDJSON ---------------------------------------------------------------
+
+def parse_ndjson(lines):
+    """Yield (line number, task, error) per non-blank line; task is None on error."""
+    for n, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            yield n, None, f"bad JSON: {e}"
+            continue
+        if not isinstance(item, dict):
+            yield n, None, "expected a JSON object"
+            continue
+        yield n, {k: item[k] for k in TASK_FIELDS if k in item}, None
+
+
+def to_ndjson(items):
+    for item in items:
+        yield json.dumps(item, default=str) + "\n"
+
+
+# --- iCalendar --------------------------------------------------------------
+
+def _unfold(lines):
+    """Yield (line number, logical line), joining RFC 5545 folded continuations."""
+    pending, start = None, 0
+    for n, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            yield start, pending
+        pending, start = line, n
+    if pending is not None:
+        yield start, pending
+
+
+def _property(line):
+    """Split "NAME;PARAM=V:value" into (NAME, {PARAM: V}, value)."""
+    quoted = False
+    for i, ch in enumerate(line):
+        if ch == '"':
+            quoted = not quoted
+        elif ch == ":" and not quoted:
+            head, value = line[:i], line[i + 1:]
+            break
+    else:
+        return None, {}, ""
+    name, *params = head.split(";")
+    params = dict(p.split("=", 1) for p in params if "=" in p)
+    return name.upper(), {k.upper(): v for k, v in params.items()}, value
+
+
+def _unescape(text):
+    return re.sub(r"\\([\\;,nN])", lambda m: "\n" if m.group(1) in "nN" else m.group(1), text)
+
+
+def _escape(text):
+    return (str(text).replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\n", "\\n"))
+
+
+def _ics_when(value, params):
+    """A DTSTART/DTEND/UNTIL value as a date (all-day) or naive local datetime."""
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        return datetime.strptime(value, "%Y%m%d").date()
+    if value.endswith("Z"):
+        utc = datetime.strptime(value, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+        return utc.astimezone().replace(tzinfo=None)
+    # floating or TZID times are taken as wall-clock times
+    return datetime.strptime(value, "%Y%m%dT%H%M%S")
+
+
+def _ics_minutes(value):
+    m = _DURATION_RE.match(value)
+    if not m or m.group(1) == "-":
+        raise ValueError(f"unsupported DURATION {value!r}")
+    weeks, days, hours, minutes, seconds = (int(g or 0) for g in m.groups()[1:])
+    return ((weeks * 7 + days) * 24 + hours) * 60 + minutes + seconds // 60
+
+
+def _rrule(value):
+    """An RRULE as this app's recurrence dict (DAILY and WEEKLY only)."""
+    parts = dict(p.split("=", 1) for p in value.upper().split(";") if "=" in p)
+    freq = parts.get("FREQ")
+    if freq not in ("DAILY", "WEEKLY"):
+        raise ValueError(f"unsupported RRULE FREQ {freq!r}")
+    rule = {"freq": freq.lower()}
+    if "INTERVAL" in parts:
+        rule["interval"] = int(parts["INTERVAL"])
+    if "COUNT" in parts:
+        rule["count"] = int(parts["COUNT"])
+    if "UNTIL" in parts:
+        until = _ics_when(parts["UNTIL"], {})
+        rule["until"] = (until if isinstance(until, date) and not isinstance(until, datetime)
+                         else until.date()).isoformat()
+    if "BYDAY" in parts:
+        days = parts["BYDAY"].split(",")
+        if freq != "WEEKLY" or any(d not in ICS_DAYS for d in days):
+            raise ValueError(f"unsupported RRULE BYDAY {parts['BYDAY']!r}")
+        rule["byweekday"] = [WEEKDAYS[ICS_DAYS.index(d)] for d in days]
+    return rule
+
+
+def _ics_task(kind, props):
+    """Task dict for one VEVENT/VTODO's properties; raises ValueError if unusable."""
+    task = {"title": _unescape(props.get("SUMMARY", ("", {}))[1]) or "Untitled"}
+    if "UID" in props:
+        task["id"] = props["UID"][1]
+    priority = props.get("PRIORITY")
+    if priority and priority[1].strip() not in ("", "0"):
+        level = int(priority[1])
+        task["priority"] = "high" if level <= 4 else "medium" if level == 5 else "low"
+
+    start = _ics_when(props["DTSTART"][1], props["DTSTART"][0]) if "DTSTART" in props else None
+    if "DURATION" in props:
+        minutes = _ics_minutes(props["DURATION"][1])
+    elif "DTEND" in props and isinstance(start, datetime):
+        end = _ics_when(props["DTEND"][1], props["DTEND"][0])
+        minutes = int((end - start).total_seconds() // 60)
+    else:
+        minutes = None
+
+    if kind == "VEVENT":
+        if not isinstance(start, datetime):
+            raise ValueError("all-day and undated events aren't imported")
+        task.update(fixed=True, date=start.date().isoformat(),
+                    start_time=start.strftime("%H:%M"), duration=minutes)
+    else:
+        # a to-do becomes a flexible task for its start (or due) day
+        when = start or (_ics_when(props["DUE"][1], props["DUE"][0]) if "DUE" in props else None)
+        task.update(fixed=False, duration=60 if minutes is None else minutes)
+        if when is not None:
+            task["date"] = (when.date() if isinstance(when, datetime) else when).isoformat()
+        for field, prop in (("earliest_time", "X-EARLIEST-TIME"), ("latest_time", "X-LATEST-TIME")):
+            if prop in props:
+                task[field] = props[prop][1]
+
+    if "RRULE" in props:
+        task["recurrence"] = _rrule(props["RRULE"][1])
+        if props.get("EXDATE"):
+            task["recurrence"]["exceptions"] = [
+                (d if isinstance(d, date) and not isinstance(d, datetime) else d.date()).isoformat()
+                for d in (_ics_when(v, {}) for v in props["EXDATE"])]
+    return task
+
+
+def parse_ics(lines):
+    """
+    Yield (line number, task, error) per VEVENT or VTODO, reading the
+    calendar line by line. Timed events become fixed tasks; to-dos become
+    flexible ones. DAILY/WEEKLY RRULEs and EXDATEs carry over; all-day
+    events, and anything else this app can't represent, come back as
+    errors. Times are taken as local wall-clock times (UTC ones are
+    converted).
+    """
+    kind, props, depth, first = None, None, 0, 0
+    for n, line in _unfold(lines):
+        name, params, value = _property(line)
+        if name == "BEGIN":
+            if kind is not None:
+                depth += 1          # VALARM and friends: skip their properties
+            elif value.upper() in ("VEVENT", "VTODO"):
+                kind, props, first = value.upper(), {"EXDATE": []}, n
+        elif name == "END" and kind is not None:
+            if depth:
+                depth -= 1
+                continue
+            try:
+                yield first, _ics_task(kind, props), None
+            except (ValueError, KeyError) as e:
+                yield first, None, str(e)
+            kind = props = None
+        elif kind is not None and not depth and name:
+            if name == "EXDATE":
+                props["EXDATE"].extend(v for v in value.split(",") if v)
+            else:
+                props[name] = (params, value)
+
+
+def _fold(line):
+    """Fold a content line at 75 octets, as RFC 5545 asks."""
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line + "\r\n"
+    out, size = [], 75
+    while data:
+        # don't split a multi-byte character
+        cut = min(size, len(data))
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        out.append(data[:cut].decode("utf-8"))
+        data, size = data[cut:], 74
+    return "\r\n ".join(out) + "\r\n"
+
+
+def _ics_date(value):
+    return str(value)[:10].replace("-", "")
+
+
+def _ics_rrule(rule):
+    if rule.get("freq") == "weekdays":
+        parts = ["FREQ=WEEKLY", "BYDAY=MO,TU,WE,TH,FR"]
+    else:
+        parts = [f"FREQ={rule.get('freq', 'weekly').upper()}"]
+        if rule.get("byweekday"):
+            parts.append("BYDAY=" + ",".join(
+                ICS_DAYS[d if isinstance(d, int) else WEEKDAYS.index(d[:3].lower())]
+                for d in rule["byweekday"]))
+    if rule.get("interval", 1) != 1:
+        parts.append(f"INTERVAL={rule['interval']}")
+    if rule.get("count") is not None:
+        parts.append(f"COUNT={rule['count']}")
+    if rule.get("until"):
+        parts.append(f"UNTIL={_ics_date(rule['until'])}")
+    lines = ["RRULE:" + ";".join(parts)]
+    if rule.get("exceptions"):
+        lines.append("EXDATE;VALUE=DATE:" + ",".join(_ics_date(d) for d in rule["exceptions"]))
+    return lines
+
+
+def to_ics(items, tasks=False):
+    """
+    Yield an iCalendar file for schedule blocks (each a VEVENT at its
+    placed time) or, with tasks=True, for stored tasks: fixed ones as
+    VEVENTs, flexible ones as VTODOs on their day.
+    """
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//fluid-ai-calendar//EN\r\n"
+    for item in items:
+        timed = not tasks or item.get("fixed")
+        kind  = "VEVENT" if timed else "VTODO"
+        lines = [f"BEGIN:{kind}", f"UID:{item.get('id') or _uid(item)}", f"DTSTAMP:{stamp}",
+                 f"SUMMARY:{_escape(item.get('title', ''))}"]
+        if timed and item.get("date"):
+            lines.append(f"DTSTART:{_ics_date(item['date'])}T{item['start_time'].replace(':', '')}00")
+        elif item.get("date"):
+            lines.append(f"DTSTART;VALUE=DATE:{_ics_date(item['date'])}")
+        lines.append(f"DURATION:PT{int(item.get('duration', 60))}M")
+        if item.get("priority") in ICS_PRIORITY:
+            lines.append(f"PRIORITY:{ICS_PRIORITY[item['priority']]}")
+        if not timed:
+            for field, prop in (("earliest_time", "X-EARLIEST-TIME"), ("latest_time", "X-LATEST-TIME")):
+                if item.get(field):
+                    lines.append(f"{prop}:{item[field]}")
+        if tasks and item.get("recurrence"):
+            lines.extend(_ics_rrule(item["recurrence"]))
+        lines.append(f"END:{kind}")
+        yield "".join(_fold(line) for line in lines)
+    yield "END:VCALENDAR\r\n"
+
+
+def _uid(block):
+    # goal blocks have no id; their date, time and title identify them
+    return re.sub(r"[^\w.-]", "-", f"{block['date']}T{block['start_time']}-{block.get('title', '')}")